@@ -0,0 +1,76 @@
+"""
+Recall@1 and query latency of the IVF gallery index against the exact
+scan, across gallery sizes.
+
+Galleries are synthetic: each identity is a random direction in embedding
+space and each of its images a noisy copy, so neighbours are clustered
+like real face embeddings. Queries are fresh noisy copies of enrolled
+identities. Recall@1 is the fraction of queries whose top IVF row is the
+exact scan's top row; identity recall compares the labels of those rows.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_ann_index --sizes 1000 10000 50000 --nprobe 8 16 32
+"""
+import time
+import argparse
+import numpy as np
+from modules.face_gallery import l2_normalize
+from modules.face_index import BruteForceIndex, IVFIndex
+
+
+def make_gallery(size: int, dim: int, images_per_identity: int, noise: float, rng):
+    identities = max(1, size // images_per_identity)
+    centers = l2_normalize(rng.standard_normal((identities, dim)))
+    labels = np.arange(size) % identities
+    embeddings = l2_normalize(centers[labels] + noise * rng.standard_normal((size, dim)) / np.sqrt(dim))
+    return centers, labels, embeddings
+
+
+def per_query_ms(index, queries) -> float:
+    """Median latency of single-query searches, as in the live loop"""
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], 1)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--dim", type=int, default=128, help="Embedding size (Facenet: 128)")
+    parser.add_argument("--images-per-identity", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.8, help="Within-identity spread")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'size':>8} {'index':<12} {'build s':>8} {'recall@1':>9} {'id recall':>9} {'ms/query':>9} {'speedup':>8}")
+    for size in args.sizes:
+        centers, labels, embeddings = make_gallery(size, args.dim, args.images_per_identity, args.noise, rng)
+        picks = rng.integers(0, len(centers), args.queries)
+        queries = l2_normalize(centers[picks] + args.noise * rng.standard_normal((args.queries, args.dim)) / np.sqrt(args.dim))
+
+        exact = BruteForceIndex(embeddings)
+        _, exact_rows = exact.search(queries, 1)
+        exact_ms = per_query_ms(exact, queries)
+        print(f"{size:>8} {'brute':<12} {0.0:>8.2f} {1.0:>9.3f} {1.0:>9.3f} {exact_ms:>9.3f} {1.0:>8.1f}")
+
+        start = time.perf_counter()
+        ivf = IVFIndex(embeddings)
+        build_s = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            _, rows = ivf.search(queries, 1)
+            recall = float(np.mean(rows[:, 0] == exact_rows[:, 0]))
+            id_recall = float(np.mean(labels[rows[:, 0]] == labels[exact_rows[:, 0]]))
+            ms = per_query_ms(ivf, queries)
+            name = f"ivf/{ivf.nlist}/{nprobe}"
+            print(f"{size:>8} {name:<12} {build_s:>8.2f} {recall:>9.3f} {id_recall:>9.3f} {ms:>9.3f} {exact_ms / ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the exported ONNX emotion model (ONNX Runtime or OpenCV DNN)
+against DeepFace's Keras model on the same aligned face crops: label
+agreement and CPU time per face at a given batch size.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_emotion_backend --export
+    python -m benchmarks.bench_emotion_backend --images 200 --batch 8 --runtime opencv
+"""
+import os
+import cv2
+import glob
+import time
+import argparse
+import numpy as np
+from modules.emotion_backends import DEFAULT_ONNX_PATH, OnnxEmotionModel, export_onnx
+from modules.emotion_detection import EmotionDetector
+from modules.face_pipeline import to_bgr_crop
+
+
+def load_crops(db_path: str, limit: int, detector: str):
+    """Aligned BGR uint8 face crops, as FacePipeline produces them"""
+    from deepface import DeepFace
+
+    crops = []
+    for path in sorted(glob.glob(os.path.join(db_path, "*", "*.jpg")))[:limit]:
+        for obj in DeepFace.extract_faces(img_path=cv2.imread(path), detector_backend=detector,
+                                          enforce_detection=False, align=True):
+            if obj.get('confidence'):
+                crops.append(to_bgr_crop(obj['face']))
+    return crops
+
+
+def run(detector: EmotionDetector, crops, batch: int):
+    """Probabilities for every crop and the median seconds per face"""
+    detector.classify(crops[:batch])  # build/warm the model
+    probs, times = [], []
+    for start in range(0, len(crops), batch):
+        chunk = crops[start:start + batch]
+        begin = time.perf_counter()
+        probs.append(detector.classify(chunk))
+        times.append((time.perf_counter() - begin) / len(chunk))
+    return np.concatenate(probs), float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", default="data/faces")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--detector", default="retinaface")
+    parser.add_argument("--batch", type=int, default=8, help="Faces per forward pass")
+    parser.add_argument("--onnx", default=DEFAULT_ONNX_PATH)
+    parser.add_argument("--runtime", choices=["auto", "onnxruntime", "opencv"], default="auto")
+    parser.add_argument("--export", action="store_true", help="(Re)export the ONNX model first (needs tf2onnx)")
+    args = parser.parse_args()
+
+    if args.export or not os.path.isfile(args.onnx):
+        print(f"Exporting {export_onnx(args.onnx)}")
+
+    crops = load_crops(args.db_path, args.images, args.detector)
+    if not crops:
+        raise SystemExit(f"No faces found under {args.db_path}")
+
+    reference = EmotionDetector(backend="deepface")
+    candidate = EmotionDetector(backend="onnx", onnx_path=args.onnx)
+    candidate._model = OnnxEmotionModel(args.onnx, args.runtime)
+
+    ref_probs, ref_s = run(reference, crops, args.batch)
+    probs, s = run(candidate, crops, args.batch)
+
+    top1 = float(np.mean(np.argmax(ref_probs, axis=1) == np.argmax(probs, axis=1)))
+    labels = float(np.mean(np.array(reference.smoother.labels(ref_probs)) == np.array(candidate.smoother.labels(probs))))
+    print(f"faces: {len(crops)}  batch: {args.batch}")
+    print(f"deepface (keras)  : {1000 * ref_s:8.3f} ms/face (median)")
+    print(f"{candidate._model.name:<17} : {1000 * s:8.3f} ms/face (median)")
+    print(f"speedup           : {ref_s / s:8.2f}x")
+    print(f"top-1 agreement   : {top1:8.3f}")
+    print(f"label agreement   : {labels:8.3f} (with the confused rule)")
+    print(f"max |prob diff|   : {float(np.max(np.abs(ref_probs - probs))):8.5f}")
+
+
+if __name__ == "__main__":
+    main()
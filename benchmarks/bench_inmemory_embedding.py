@@ -0,0 +1,81 @@
+"""
+Compare the old tempfile JPEG round-trip against passing the frame
+straight to DeepFace.represent.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_inmemory_embedding --images 20
+"""
+import os
+import cv2
+import glob
+import time
+import argparse
+import tempfile
+import numpy as np
+from deepface import DeepFace
+from modules.face_gallery import l2_normalize
+
+MODEL_NAME = "Facenet"
+DETECTOR = "retinaface"
+
+
+def embed(img_path):
+    return np.asarray(DeepFace.represent(
+        img_path=img_path,
+        model_name=MODEL_NAME,
+        enforce_detection=False,
+        detector_backend=DETECTOR,
+        align=True
+    )[0]['embedding'], dtype=np.float32)
+
+
+def embed_via_file(img: np.ndarray, ext: str) -> np.ndarray:
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=True) as tmp:
+        cv2.imwrite(tmp.name, img)
+        return embed(tmp.name)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", default="data/faces")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--infer-size", type=int, nargs=2, default=(480, 360))
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.db_path, "*", "*.jpg")))[:args.images]
+    if not paths:
+        raise SystemExit(f"No images found under {args.db_path}")
+
+    # Warm up model construction so it is not billed to the first sample
+    embed(cv2.resize(cv2.imread(paths[0]), tuple(args.infer_size)))
+
+    t_jpg, t_png, t_mem, sim_jpg, sim_png = [], [], [], [], []
+    for path in paths:
+        frame = cv2.resize(cv2.imread(path), tuple(args.infer_size))
+        e_mem, dt = timed(embed, frame)
+        t_mem.append(dt)
+        e_jpg, dt = timed(embed_via_file, frame, '.jpg')
+        t_jpg.append(dt)
+        e_png, dt = timed(embed_via_file, frame, '.png')
+        t_png.append(dt)
+        sim_jpg.append(float(l2_normalize(e_mem) @ l2_normalize(e_jpg)))
+        sim_png.append(float(l2_normalize(e_mem) @ l2_normalize(e_png)))
+
+    ms = lambda xs: 1000 * float(np.median(xs))
+    print(f"images: {len(paths)}  frame size: {args.infer_size[0]}x{args.infer_size[1]}")
+    print(f"tempfile .jpg : {ms(t_jpg):8.2f} ms/call (median)")
+    print(f"tempfile .png : {ms(t_png):8.2f} ms/call (median)")
+    print(f"in-memory     : {ms(t_mem):8.2f} ms/call (median)")
+    print(f"saving vs jpg : {ms(t_jpg) - ms(t_mem):8.2f} ms/call")
+    print(f"cosine(in-memory, lossless file): min {min(sim_png):.6f}")
+    print(f"cosine(in-memory, jpeg file)    : min {min(sim_jpg):.6f} (differs only by JPEG re-encode)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,93 @@
-import cv2
 import time
+_START = time.perf_counter()  # The startup report counts from process import
+
+import cv2
 import os
+import argparse
 import numpy as np
 from modules.ui_display import UIDisplay
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from modules.face_recognition import FaceRecognizer
 from modules.emotion_detection import EmotionDetector
+from modules.face_pipeline import FacePipeline
+from modules.face_tracker import FaceTracker
 from modules.attendance_logger import AttendanceLogger
 from modules.gesture_controller import GestureController
-from modules.camera_calibration import calibrate_camera, undistort_image
+from modules.frame_source import CaptureThread
+from modules.camera_calibration import calibrate_camera, Undistorter
+from modules.metrics import MetricsReporter, StageTimer
+from modules.scheduler import InferenceScheduler, SequenceGate
+from modules.inference_pool import InferencePool
+_IMPORTED = time.perf_counter()
 
 class AttendanceSystem:
-    def __init__(self):
+    def __init__(self, cam_index=0, detect_interval=20, infer_size=(480, 360), undistort_mode="full",
+                 attendance_file="attendance.xlsx", store_path="attendance.db", use_tracker=True,
+                 schedule="adaptive", inference_workers=0, gesture_parallel=False,
+                 metrics_interval=10.0, metrics_file=None, metrics_port=None, debug_panel=False):
         # Configuration
-        self.cam_index = 0
-        self.detect_interval = 20
-        self.infer_size = (480, 360)
+        self.cam_index = cam_index
+        self.detect_interval = detect_interval
+        self.infer_size = tuple(infer_size)
+        self.undistort_mode = undistort_mode  # "full" frame, "infer"-sized frame only, or "off"
+        self.use_tracker = use_tracker  # Off: identify every detected face on every tick
+        self.inference_workers = inference_workers  # 0: models run in this process on one thread
+        self.max_in_flight = max(1, inference_workers)
+        # "adaptive": submit on motion whenever the worker is free; "fixed": every detect_interval frames
+        self.scheduler = InferenceScheduler(workers=self.max_in_flight) if schedule == "adaptive" else None
+        self.timer = StageTimer()  # Per-stage wall time, shared by the live and offline loops
+        self.startup = StageTimer()  # One-off startup costs, reported once the models are warm
+        self.startup.record('imports', _IMPORTED - _START)
         
-        # Initialize modules
-        self.face_recognizer = FaceRecognizer()
-        self.emotion_detector = EmotionDetector()
-        self.attendance_logger = AttendanceLogger()
+        # Initialize modules (heavy libraries are imported lazily, by the warm-up below)
+        with self.startup.time('gallery'):
+            if inference_workers > 0:
+                # Worker processes load their own models; frames go through shared memory
+                self.face_recognizer = self.emotion_detector = None
+                self.face_pipeline = InferencePool(inference_workers, (self.infer_size[1], self.infer_size[0], 3),
+                                                   timer=self.timer)
+            else:
+                self.face_recognizer = FaceRecognizer()
+                self.emotion_detector = EmotionDetector()
+                self.face_pipeline = FacePipeline(self.face_recognizer, self.emotion_detector, timer=self.timer)
+        # Dropped tracks free their emotion-smoothing rows
+        self.face_tracker = FaceTracker(on_drop=self.face_pipeline.forget)
+        with self.startup.time('attendance_store'):
+            self.attendance_logger = AttendanceLogger(attendance_file, store_path)
         self.ui = UIDisplay()
         
-        # Camera calibration
+        # Camera calibration (undistortion is a cached-map remap, cheap enough to keep on)
         self.mtx, self.dist = None, None
-        # self._initialize_calibration()
+        self.undistorter = None
+        if self.undistort_mode != "off":
+            with self.startup.time('calibration'):
+                self._initialize_calibration()
+                if self.mtx is not None and self.dist is not None:
+                    self.undistorter = Undistorter(self.mtx, self.dist)
         
-        # Camera
-        self.cap = cv2.VideoCapture(self.cam_index)
-        if not self.cap.isOpened():
-            raise RuntimeError("Cannot open camera")
-            
         # Threading
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        self.future = None
-        self.last_result = (None, None, False)
+        # One dispatch thread per inference worker; results are applied in submission order
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self.in_flight = deque()  # (sequence number, submit time, future)
+        self.submit_seq = 0
+        # With several workers jobs finish out of order; tracker updates still apply in frame order
+        self.associate_gate = SequenceGate(first=1)
+        self.assign_gate = SequenceGate(first=1)
+        self.last_result = set()  # Names newly logged by the last inference
         self.frame_count = 0  # Initialize frame counter
-        self.gesture_controller = GestureController()
+        self.gesture_controller = None  # Created (and MediaPipe imported) on the first toggle
         self.gesture_mode = False  # Toggle with 'g' key
+        self.gesture_parallel = gesture_parallel  # Gestures overlay attendance instead of replacing it
+        
+        # Build and warm every model in the background while the camera opens
+        self.warmup = self.executor.submit(self._warm_up)
+        self.startup_reported = False
+        
+        # Metrics: log line every metrics_interval seconds, plus an optional Prometheus file and/or local endpoint
+        self.metrics = MetricsReporter(self.timer, metrics_interval, path=metrics_file, port=metrics_port,
+                                       gauges=self._sample_gauges)
+        self.debug_panel = debug_panel  # On-screen stage latencies; toggle with 'm'
         
 
     def _initialize_calibration(self):
@@ -77,46 +126,168 @@ class AttendanceSystem:
                 print("Please add chessboard images to data/calibration/ and restart")
                 self.mtx = self.dist = None
 
-    def _undistort_frame(self, frame):
-        """Apply undistortion if calibration data exists"""
-        if self.mtx is not None and self.dist is not None:
-            return undistort_image(frame, self.mtx, self.dist)
+    def _warm_up(self):
+        """Run each model once on a dummy inference-sized frame"""
+        frame_shape = (self.infer_size[1], self.infer_size[0], 3)
+        try:
+            self.face_pipeline.warm_up(frame_shape, self.startup)
+        except Exception as e:
+            if not isinstance(self.face_pipeline, InferencePool):
+                raise
+            # Keep running on one in-process pipeline rather than not at all
+            print(f"[POOL] Error: {str(e)}; falling back to in-process inference")
+            self.face_pipeline.close()
+            self.face_recognizer = FaceRecognizer()
+            self.emotion_detector = EmotionDetector()
+            self.face_pipeline = FacePipeline(self.face_recognizer, self.emotion_detector, timer=self.timer)
+            self.face_tracker.on_drop = self.face_pipeline.forget
+            self.max_in_flight = 1
+            if self.scheduler is not None:
+                self.scheduler.workers = 1
+            self.face_pipeline.warm_up(frame_shape, self.startup)
+
+    def _report_startup(self):
+        """Print where startup time went; call once the warm-up has finished"""
+        self.startup_reported = True
+        try:
+            self.warmup.result()
+        except Exception as e:
+            print(f"[STARTUP] Warm-up failed: {str(e)}")
+        breakdown = ", ".join(f"{stage} {s['total_ms'] / 1000:.2f}s"
+                              for stage, s in self.startup.summary().items())
+        print(f"[STARTUP] Ready after {time.perf_counter() - _START:.2f}s ({breakdown})")
+
+    def enroll_batch(self, items, **kwargs):
+        """Enroll (user_id, BGR image) pairs while running, in this process or across the worker pool"""
+        return self.face_pipeline.enroll_batch(items, **kwargs)
+
+    def _sample_gauges(self):
+        """Queue depths and drop counts owned by other components, sampled at report time"""
+        gauges = {
+            'inference_in_flight': len(self.in_flight),
+            'attendance_queue_depth': self.attendance_logger.stats()['queue_depth']
+        }
+        if isinstance(self.face_pipeline, InferencePool):
+            gauges['pool_pending'] = self.face_pipeline.pending
+        capture = getattr(self, 'capture', None)
+        if capture is not None:
+            gauges['capture_dropped'] = capture.stats()['dropped']
+        if self.scheduler is not None:
+            stats = self.scheduler.stats()
+            gauges['scheduler_skipped_static'] = stats['skipped_static']
+            gauges['scheduler_skipped_budget'] = stats['skipped_budget']
+        return gauges
+
+    def _undistort_frame(self, frame, mode):
+        """Apply undistortion if calibration data exists and the mode matches"""
+        if self.undistorter is not None and self.undistort_mode == mode:
+            return self.undistorter(frame)
         return frame
 
-    def _async_process(self, frame):
-        """Background processing task"""
-        name, confidence = self.face_recognizer.recognize_face(frame)
-        emotion = self.emotion_detector.detect(frame)['dominant']
-        new_log = False
+    def _prepare_frame(self, frame):
+        """Undistort and downscale a captured frame; returns (display frame, inference frame)"""
+        with self.timer.time('undistort'):
+            frame = self._undistort_frame(frame, "full")
+        with self.timer.time('resize'):
+            small_frame = cv2.resize(frame, self.infer_size)
+        if self.undistort_mode == "infer":
+            with self.timer.time('undistort'):
+                small_frame = self._undistort_frame(small_frame, "infer")
+        return frame, small_frame
+
+    def _display_tracks(self, tracks):
+        """Tracks with boxes on the display frame's geometry ("infer" mode only undistorts the inference frame)"""
+        if self.undistorter is None or self.undistort_mode != "infer":
+            return tracks
+        boxes = self.undistorter.distort_boxes([track.box for track in tracks], self.infer_size)
+        return [track._replace(box=box) for track, box in zip(tracks, boxes)]
+
+    def _should_infer(self, small_frame, frame_index):
+        """Whether to submit this frame, given that the inference worker is free"""
+        if self.scheduler is not None:
+            return self.scheduler.should_submit(small_frame)
+        return frame_index % self.detect_interval == 0
+
+    def _async_process(self, frame, seq):
+        """
+        Background processing task for the frame with submission number seq.
+        Detection and identification overlap across workers; the tracker
+        steps wait for every earlier frame's, so an older frame never moves
+        tracks back or relabels them after a newer one.
+        """
+        # Detect every tick, but only embed faces the tracker cannot vouch for
+        try:
+            faces = self.face_pipeline.detect(frame)
+        except Exception as e:
+            print(f"[PIPELINE] Detection error: {str(e)}")
+            faces = []
+        with self.associate_gate.turn(seq):
+            if self.use_tracker:
+                pending = self.face_tracker.associate(faces, frame)
+            else:
+                pending = [(None, face) for face in faces]
+        # Emotions are smoothed per track; without tracks only the largest face is
+        keys = [track_id for track_id, _ in pending] if self.use_tracker else None
+        try:
+            results = self.face_pipeline.identify([face for _, face in pending], keys)
+        except Exception as e:
+            print(f"[PIPELINE] Identification error: {str(e)}")
+            results = []
+        new_logs = set()
         
-        if name and confidence > 0.6:
-            new_log = self.attendance_logger.log(name, emotion)
+        with self.assign_gate.turn(seq):
+            for (track_id, _), (_, name, confidence, emotion) in zip(pending, results):
+                if track_id is not None:
+                    self.face_tracker.assign(track_id, name, confidence, emotion)
+                if name and confidence > 0.6:
+                    with self.timer.time('log'):
+                        logged = self.attendance_logger.log(name, emotion)
+                    if logged:
+                        new_logs.add(name)
         
-        return name, emotion, new_log
+        return new_logs
 
     def run(self):
+        # Camera (read on its own thread; the loop below always gets the newest frame)
+        with self.startup.time('camera_open'):
+            self.capture = CaptureThread(self.cam_index).start()
         try:
             self.pTime = time.time()  # Initialize previous time
             
             while True:
-                ret, frame = self.cap.read()
+                ret, frame = self.capture.read()
                 if not ret:
-                    break
+                    if self.capture.ended:
+                        break
+                    continue
+                
+                # Age of the frame when the loop picks it up
+                self.timer.record('capture', time.monotonic() - self.capture.last_timestamp)
+                
+                if not self.startup_reported and self.warmup.done():
+                    self._report_startup()
                 
                 # Calculate FPS (works in both modes)
                 self.cTime = time.time()
                 fps = 1 / (self.cTime - self.pTime)
                 self.pTime = self.cTime
+                self.timer.set('fps', round(fps, 1))
                 
                 # Check for mode toggle key
                 key = cv2.waitKey(1)
                 if key == ord('g'):
                     self.gesture_mode = not self.gesture_mode
                     print(f"Gesture mode {'enabled' if self.gesture_mode else 'disabled'}")
+                    if self.gesture_mode and self.gesture_controller is None:
+                        self.gesture_controller = GestureController()
+                elif key == ord('m'):
+                    self.debug_panel = not self.debug_panel
                 
-                if self.gesture_mode:
+                render_s = 0.0  # Overlay drawing, added to the display time below
+                if self.gesture_mode and not self.gesture_parallel:
                     # Process gesture control
-                    frame = self.gesture_controller.process_frame(frame)
+                    with self.timer.time('gesture'):
+                        frame = self.gesture_controller.process_frame(frame)
                     
                     # Display mode indicator
                     cv2.putText(frame, "GESTURE CONTROL MODE", (180, 40), 
@@ -125,43 +296,115 @@ class AttendanceSystem:
                             cv2.FONT_HERSHEY_PLAIN, 1.5, (200, 200, 200), 2)
                 else:
                     # Normal attendance system processing
-                    frame = self._undistort_frame(frame)
+                    frame, small_frame = self._prepare_frame(frame)
                     self.frame_count += 1
                     
-                    # Schedule inference
-                    if self.frame_count % self.detect_interval == 0 and self.future is None:
-                        small_frame = cv2.resize(frame, self.infer_size)
-                        self.future = self.executor.submit(self._async_process, small_frame)
+                    # Tracks follow faces on the inference-sized frame between detections
+                    tracks = self.face_tracker.update(small_frame)
                     
-                    # Get results if available
-                    if self.future and self.future.done():
-                        self.last_result = self.future.result()
-                        self.future = None
+                    # Schedule inference (once the models are warm, so no frame waits behind the warm-up)
+                    if self.warmup.done() and len(self.in_flight) >= self.max_in_flight:
+                        # Frame never considered: every inference slot is busy
+                        self.timer.add('infer_dropped')
+                    elif self.warmup.done() and self._should_infer(small_frame, self.frame_count):
+                        self.submit_seq += 1
+                        self.timer.add('infer_submitted')
+                        self.in_flight.append((self.submit_seq, time.monotonic(),
+                                               self.executor.submit(self._async_process, small_frame,
+                                                                    self.submit_seq)))
+                    
+                    # Get results if available, oldest first so they apply in sequence
+                    while self.in_flight and self.in_flight[0][2].done():
+                        _, submitted, future = self.in_flight.popleft()
+                        self.last_result = future.result()
+                        if self.scheduler is not None:
+                            self.scheduler.completed(time.monotonic() - submitted)
                     
                     # Display attendance information
-                    name, emotion, new_log = self.last_result
-                    frame = self.ui.draw_overlay(frame, name, emotion, new_log)
+                    scale = (frame.shape[1] / self.infer_size[0], frame.shape[0] / self.infer_size[1])
+                    render_start = time.perf_counter()
+                    frame = self.ui.draw_overlay(frame, self._display_tracks(tracks), self.last_result, scale)
+                    render_s = time.perf_counter() - render_start
+                    
+                    if self.gesture_mode:
+                        # Hands on the same (unmirrored) frame, while inference keeps running;
+                        # no skeleton over the face boxes
+                        with self.timer.time('gesture'):
+                            frame = self.gesture_controller.process_frame(frame, mirror=False, draw_hand=False)
                     
                     # Show mode indicator
-                    cv2.putText(frame, "Press 'g' for gesture control", (10, 20), 
+                    cv2.putText(frame, "Press 'g' to toggle gesture control", (10, 20), 
                             cv2.FONT_HERSHEY_PLAIN, 1.2, (200, 200, 200), 1)
                 
+                render_start = time.perf_counter()
                 # Display FPS
                 cv2.putText(frame, f'FPS: {int(fps)}', (frame.shape[1]-100, 30), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (20, 180, 20), 2)
                 
+                if self.debug_panel:
+                    snap = self.timer.snapshot()
+                    frame = self.ui.draw_debug_panel(frame, self.timer.summary(), {**snap['counts'], **snap['gauges']})
+                
                 # Show the frame
                 cv2.imshow("Smart Attendance System", frame)
+                self.timer.record('render', render_s + time.perf_counter() - render_start)
+                
+                self.metrics.tick()
                 
                 # Exit on ESC
                 if key == 27:
                     break
                     
         finally:
-            self.cap.release()
+            self.capture.stop()
+            print(f"[CAPTURE] Frame stats: {self.capture.stats()}")
+            self.metrics.close()
+            if self.scheduler is not None:
+                print(f"[SCHEDULER] {self.scheduler.stats()}")
             self.executor.shutdown()
+            if isinstance(self.face_pipeline, InferencePool):
+                self.face_pipeline.close()
+            # Drain the attendance writer (after inference stops) and export the sheet
+            self.attendance_logger.close()
             cv2.destroyAllWindows()
    
+def main():
+    parser = argparse.ArgumentParser(description="Live attendance and emotion monitoring from one camera")
+    parser.add_argument("--camera", type=int, default=0, help="Camera device index")
+    parser.add_argument("--schedule", choices=["fixed", "adaptive"], default="adaptive",
+                        help="fixed: every --detect-interval frames; adaptive: on motion, within a CPU budget")
+    parser.add_argument("--detect-interval", type=int, default=20)
+    parser.add_argument("--infer-size", type=int, nargs=2, default=(480, 360), metavar=("W", "H"))
+    parser.add_argument("--undistort", choices=["full", "infer", "off"], default="full")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Inference worker processes (0: in this process)")
+    parser.add_argument("--gesture-parallel", action="store_true",
+                        help="Keep attendance running under the gesture overlay ('g') instead of pausing it")
+    parser.add_argument("--attendance-file", default="attendance.xlsx")
+    parser.add_argument("--store", default="attendance.db")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    parser.add_argument("--metrics-file", help="Prometheus text metrics file, rewritten every interval")
+    parser.add_argument("--metrics-port", type=int, help="Serve metrics on http://127.0.0.1:<port>/metrics")
+    parser.add_argument("--debug-panel", action="store_true", help="Start with the stage latency panel shown")
+    args = parser.parse_args()
+
+    system = AttendanceSystem(
+        cam_index=args.camera,
+        detect_interval=args.detect_interval,
+        infer_size=args.infer_size,
+        undistort_mode=args.undistort,
+        attendance_file=args.attendance_file,
+        store_path=args.store,
+        schedule=args.schedule,
+        inference_workers=args.workers,
+        gesture_parallel=args.gesture_parallel,
+        metrics_interval=args.metrics_interval,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port,
+        debug_panel=args.debug_panel
+    )
+    system.run()
+
+
 if __name__ == "__main__":
-    system = AttendanceSystem()
-    system.run()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,41 +1,197 @@
 import os
-import pandas as pd
-from typing import Optional
+import time
+import queue
+import threading
+from typing import Dict, Optional
 from datetime import datetime
+from modules.attendance_store import COLUMNS, open_store
+
+# Control items on the writer queue
+_FLUSH = object()
+_STOP = object()
 
 class AttendanceLogger:
-    def __init__(self, file_path: str = "attendance.xlsx"):
+    def __init__(self, file_path: str = "attendance.xlsx", store_path: str = "attendance.db",
+                 batch_size: int = 32, flush_interval: float = 0.5, max_queue: int = 1024,
+                 sync: str = "normal"):
+        """
+        Args:
+            file_path: Excel/CSV sheet exported on demand and at session end
+            store_path: Append-only store every log goes to (.db for SQLite WAL, .csv for a journal)
+            batch_size: Queued records that trigger an immediate flush
+            flush_interval: Longest time (s) a record waits in the writer before it is flushed
+            max_queue: Capacity of the writer queue; log() fails rather than block when full
+            sync: fsync policy of the store: 'always', 'normal' or 'off'
+        """
         self.file_path = file_path
+        self.store_path = store_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M")
         self.logged = set()
-        self._init_file()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._init_store(sync)
+
+        # Writer metrics
+        self.records_written = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+        self.write_errors = 0
+        self._error: Optional[Exception] = None  # last failed write, cleared by the next successful one
+
+        # Disk writes happen on a dedicated thread so inference never waits on them
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._writer_loop, name="attendance-writer", daemon=True)
+        self._writer.start()
+
+    def _init_store(self, sync: str):
+        is_new = not os.path.exists(self.store_path)
+        self.store = open_store(self.store_path, sync)
 
-    def _init_file(self):
-        if not os.path.exists(self.file_path):
-            pd.DataFrame(columns=['Name', 'Emotion', 'Timestamp', 'Session']).to_excel(self.file_path, index=False)
+        # Carry the history of an existing sheet over into a fresh store once
+        if is_new and os.path.exists(self.file_path) and self.file_path != self.store_path:
+            try:
+                import pandas as pd
+                df = pd.read_excel(self.file_path) if self.file_path.endswith('.xlsx') else pd.read_csv(self.file_path)
+                df = df.reindex(columns=COLUMNS).fillna('')
+                df['Timestamp'] = df['Timestamp'].astype(str)
+                self.store.append(list(df.astype(str).itertuples(index=False, name=None)))
+            except Exception as e:
+                print(f"[ATTENDANCE] Could not import {self.file_path}: {str(e)}")
 
     def log(self, name: str, emotion: str) -> bool:
-        if name in self.logged:
+        """Queue an attendance record; returns whether this is a new log, without touching disk"""
+        with self._lock:
+            # Nothing is written after close(), so late callers get a plain "not logged"
+            if self._closed or name in self.logged:
+                return False
+                
+            record = (name, emotion, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), self.session_id)
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                print(f"[ATTENDANCE] Error: writer queue full, dropping log for {name}")
+                return False
+
+            self.logged.add(name)
+            return True
+
+    def flush(self) -> bool:
+        """Block until every queued record has been handed to the store; False if the write failed"""
+        if self._writer.is_alive():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+        if self._error is not None:
+            print(f"[ATTENDANCE] Error: flush incomplete, last write failed with {str(self._error)}")
             return False
-            
-        record = {
-            'Name': name,
-            'Emotion': emotion,
-            'Timestamp': datetime.now(),
-            'Session': self.session_id
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        """Writer queue depth and flush latency"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'records_written': self.records_written,
+            'flushes': self.flush_count,
+            'last_flush_ms': self.last_flush_ms,
+            'mean_flush_ms': self._flush_ms_total / self.flush_count if self.flush_count else 0.0,
+            'max_flush_ms': self.max_flush_ms,
+            'write_errors': self.write_errors
         }
 
-        try:
-            if self.file_path.endswith('.xlsx'):
-                df = pd.read_excel(self.file_path)
-                df = pd.concat([df, pd.DataFrame([record])])
-                df.to_excel(self.file_path, index=False)
+    def _writer_loop(self):
+        batch, oldest = [], None
+        while True:
+            if oldest is None:
+                wait = self.flush_interval
             else:
-                df = pd.DataFrame([record])
-                df.to_csv(self.file_path, mode='a', header=not os.path.exists(self.file_path), index=False)
-            
-            self.logged.add(name)
-            return True
+                wait = max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                items = [self._queue.get(timeout=wait)]
+            except queue.Empty:
+                items = []
+
+            # Coalesce whatever else is already waiting
+            while items:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [item for item in items if item is not _FLUSH and item is not _STOP]
+            if records and oldest is None:
+                oldest = time.monotonic()
+            batch.extend(records)
+
+            stop = any(item is _STOP for item in items)
+            forced = stop or any(item is _FLUSH for item in items)
+            due = oldest is not None and time.monotonic() - oldest >= self.flush_interval
+            if batch and (forced or due or len(batch) >= self.batch_size):
+                if self._write(batch):
+                    batch, oldest = [], None
+                else:
+                    # Keep the batch and retry after another interval
+                    oldest = time.monotonic()
+
+            for _ in items:
+                self._queue.task_done()
+            if stop:
+                if batch:
+                    print(f"[ATTENDANCE] Error: {len(batch)} records could not be written")
+                return
+
+    def _write(self, batch) -> bool:
+        start = time.perf_counter()
+        try:
+            self.store.append(batch)
+        except Exception as e:
+            print(f"[ATTENDANCE] Error: {str(e)}")
+            self._error = e
+            self.write_errors += 1
+            return False
+
+        self._error = None
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        self.records_written += len(batch)
+        self.flush_count += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_total += elapsed_ms
+        return True
+
+    def export(self, path: Optional[str] = None):
+        """Write the full attendance history to an Excel (.xlsx) or CSV sheet"""
+        import pandas as pd
+        path = path or self.file_path
+        self.flush()
+        df = pd.DataFrame(self.store.read_all(), columns=COLUMNS)
+        if path.endswith('.xlsx'):
+            df.to_excel(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+    def close(self, export: bool = True) -> bool:
+        """
+        Drain the writer queue, optionally export the sheet, and close the
+        store. Returns False if records were lost or the export failed.
+        """
+        with self._lock:
+            self._closed = True
+        ok = True
+        try:
+            if self._writer.is_alive():
+                self._queue.put(_STOP)
+                self._writer.join()
+            print(f"[ATTENDANCE] Writer stats: {self.stats()}")
+            # The writer gives up on a batch it cannot write at _STOP
+            ok = self._error is None
+            if export and self.file_path != self.store_path:
+                self.export()
         except Exception as e:
             print(f"[ATTENDANCE] Error: {str(e)}")
-            return False
\ No newline at end of file
+            ok = False
+        finally:
+            self.store.close()
+        return ok
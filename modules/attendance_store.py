@@ -0,0 +1,91 @@
+import os
+import csv
+import sqlite3
+import threading
+from typing import List, Sequence, Tuple
+
+COLUMNS = ['Name', 'Emotion', 'Timestamp', 'Session']
+Record = Tuple[str, str, str, str]
+
+# sync policy -> SQLite synchronous pragma
+SQLITE_SYNC = {'always': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
+
+class SQLiteStore:
+    """Append-only attendance table in an SQLite database in WAL mode"""
+
+    def __init__(self, path: str, sync: str = 'normal'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={SQLITE_SYNC[sync]}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS attendance ("
+            "id INTEGER PRIMARY KEY, name TEXT NOT NULL, emotion TEXT, "
+            "timestamp TEXT NOT NULL, session TEXT)"
+        )
+        self.conn.commit()
+
+    def append(self, records: Sequence[Record]):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO attendance (name, emotion, timestamp, session) VALUES (?, ?, ?, ?)",
+                records
+            )
+
+    def read_all(self) -> List[Record]:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT name, emotion, timestamp, session FROM attendance ORDER BY id"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class CsvJournal:
+    """Append-only, line-buffered CSV journal"""
+
+    def __init__(self, path: str, sync: str = 'normal'):
+        self.path = path
+        self.sync = sync
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='', buffering=1)
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(COLUMNS)
+
+    def append(self, records: Sequence[Record]):
+        with self._lock:
+            # Line buffering hands every record to the OS as it is written
+            self.writer.writerows(records)
+            if self.sync == 'always':
+                os.fsync(self.file.fileno())
+
+    def read_all(self) -> List[Record]:
+        with self._lock:
+            self.file.flush()
+            with open(self.path, newline='') as f:
+                rows = csv.DictReader(f)
+                return [tuple(row.get(c) or '' for c in COLUMNS) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.file.flush()
+            if self.sync != 'off':
+                os.fsync(self.file.fileno())
+            self.file.close()
+
+
+def open_store(path: str, sync: str = 'normal'):
+    """Pick the store backend from the file extension (.db/.sqlite or .csv, or SQLite ':memory:')"""
+    if sync not in SQLITE_SYNC:
+        raise ValueError(f"Unknown sync policy '{sync}', expected one of {list(SQLITE_SYNC)}")
+    if path.endswith('.csv'):
+        return CsvJournal(path, sync)
+    if path == ':memory:' or path.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SQLiteStore(path, sync)
+    raise ValueError(f"Unsupported attendance store '{path}', use .db/.sqlite or .csv")
@@ -1,41 +1,120 @@
 import os
 import cv2
 import glob
+import hashlib
 import numpy as np
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+CORNER_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _find_corners(fname: str, chessboard_size: Tuple[int, int],
+                  search_width: int = 640) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]:
+    """
+    Chessboard corners of one image as (corners or None, (width, height)).
+    Searches a downscaled copy first, then refines on full resolution.
+    """
+    img = cv2.imread(fname)
+    if img is None:
+        return None, None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    size = gray.shape[::-1]
+    flags = CORNER_FLAGS
+
+    ret, corners = False, None
+    scale = search_width / size[0]
+    if scale < 1:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, corners = cv2.findChessboardCorners(small, chessboard_size, flags=flags)
+        if ret:
+            corners = corners / scale
+    if not ret:
+        ret, corners = cv2.findChessboardCorners(gray, chessboard_size, flags=flags)
+    if not ret:
+        return None, size
+
+    corners = cv2.cornerSubPix(gray, corners.astype(np.float32), (11, 11), (-1, -1), SUBPIX_CRITERIA)
+    return corners, size
+
+
+def _load_corner_cache(path: str) -> Dict[str, np.ndarray]:
+    if not os.path.isfile(path):
+        return {}
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
 
 def calibrate_camera(calib_images_dir="data/calibration", 
                     chessboard_size=(9,6), 
-                    cache_file="camera_params.npz"):
+                    cache_file="camera_params.npz",
+                    corner_cache: Optional[str] = None,
+                    workers: Optional[int] = None):
     """
     Basic camera calibration using chessboard pattern.
     Returns (camera_matrix, dist_coeffs) or raises ValueError.
+
+    Corners are cached per image (keyed by file hash and board size) so only
+    new images are searched, in a process pool. The parameter cache is
+    rebuilt whenever the image set or chessboard size changes.
     """
+    corner_cache = corner_cache or os.path.join(calib_images_dir, "corners.npz")
+    images = sorted(glob.glob(os.path.join(calib_images_dir, "*.jpg")) +
+                    glob.glob(os.path.join(calib_images_dir, "*.png")))
+    # Detection flags are part of the key so results found with other flags are searched again
+    board = f"{chessboard_size[0]}x{chessboard_size[1]}_f{CORNER_FLAGS}"
+    keys = {fname: f"{_file_hash(fname)}_{board}" for fname in images}
+    fingerprint = hashlib.sha1("|".join(sorted(keys.values())).encode("utf-8")).hexdigest()
+
     # Try to load cached calibration
     if os.path.isfile(cache_file):
         with np.load(cache_file) as data:
-            return data["camera_matrix"], data["dist_coeffs"]
+            cached = {k: data[k] for k in data.files}
+        if "fingerprint" not in cached:
+            # Caches from before invalidation are adopted for the current images once,
+            # so from now on a changed image set or board size recalibrates
+            print(f"Recording the calibration image fingerprint in {cache_file}")
+            np.savez(cache_file, **cached, fingerprint=fingerprint)
+            return cached["camera_matrix"], cached["dist_coeffs"]
+        if str(cached["fingerprint"]) == fingerprint:
+            return cached["camera_matrix"], cached["dist_coeffs"]
+
+    # Find chessboard corners, only for images not seen before
+    cache = _load_corner_cache(corner_cache)
+    todo = [fname for fname in images if keys[fname] not in cache]
+    if todo:
+        if len(todo) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                found = list(pool.map(_find_corners, todo, [chessboard_size] * len(todo)))
+        else:
+            found = [_find_corners(fname, chessboard_size) for fname in todo]
+        for fname, (corners, size) in zip(todo, found):
+            if size is None:
+                continue
+            # Failed searches are cached too (as empty) so they are not retried
+            cache[keys[fname]] = corners if corners is not None else np.empty((0, 1, 2), np.float32)
+            cache[f"size_{keys[fname]}"] = np.array(size)
+        np.savez(corner_cache, **cache)
+
+    # Collect detections; calibrateCamera needs one image size, so use the most common
+    detections = [(cache[keys[f]], tuple(cache[f"size_{keys[f]}"])) for f in images
+                  if keys[f] in cache and len(cache[keys[f]])]
+    image_size = Counter(size for _, size in detections).most_common(1)[0][0] if detections else None
+    imgpoints = [corners for corners, size in detections if size == image_size]
+    if len(imgpoints) < len(detections):
+        print(f"Skipping {len(detections) - len(imgpoints)} calibration images not sized {image_size}")
 
     # Prepare object points
     objp = np.zeros((chessboard_size[0]*chessboard_size[1], 3), np.float32)
     objp[:,:2] = np.mgrid[0:chessboard_size[0], 0:chessboard_size[1]].T.reshape(-1,2)
-
-    # Find chessboard corners
-    objpoints, imgpoints = [], []
-    images = glob.glob(os.path.join(calib_images_dir, "*.jpg")) + \
-             glob.glob(os.path.join(calib_images_dir, "*.png"))
-
-    for fname in images:
-        img = cv2.imread(fname)
-        if img is None:
-            continue
-            
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        ret, corners = cv2.findChessboardCorners(gray, chessboard_size, None)
-        
-        if ret:
-            objpoints.append(objp)
-            imgpoints.append(corners)
+    objpoints = [objp] * len(imgpoints)
 
     # Check we have enough images
     if len(objpoints) < 5:
@@ -43,15 +122,124 @@ def calibrate_camera(calib_images_dir="data/calibration",
 
     # Calibrate camera
     ret, mtx, dist, _, _ = cv2.calibrateCamera(
-        objpoints, imgpoints, gray.shape[::-1], None, None)
+        objpoints, imgpoints, image_size, None, None)
 
     if not ret:
         raise ValueError("Camera calibration failed")
 
     # Save cache
-    np.savez(cache_file, camera_matrix=mtx, dist_coeffs=dist)
+    np.savez(cache_file, camera_matrix=mtx, dist_coeffs=dist,
+             image_size=np.array(image_size), fingerprint=fingerprint)
     return mtx, dist
 
+def load_calibration_size(mtx: np.ndarray, cache_file: str = "camera_params.npz") -> Tuple[int, int]:
+    """
+    (width, height) the calibration was computed at. Older caches do not
+    record it, so fall back to twice the principal point.
+    """
+    if os.path.isfile(cache_file):
+        with np.load(cache_file) as data:
+            if "image_size" in data:
+                return tuple(int(v) for v in data["image_size"])
+    return int(round(2 * mtx[0, 2])), int(round(2 * mtx[1, 2]))
+
+
+class Undistorter:
+    """
+    Undistortion with cv2.remap and fixed-point (CV_16SC2) maps built once
+    per frame size by initUndistortRectifyMap, instead of cv2.undistort
+    recomputing the mapping on every frame. Maps are kept in memory and
+    cached on disk next to the calibration file.
+    """
+
+    def __init__(self, mtx: np.ndarray, dist: np.ndarray,
+                 calib_size: Optional[Tuple[int, int]] = None,
+                 cache_file: Optional[str] = "camera_params.npz"):
+        """
+        Args:
+            calib_size: (width, height) of the calibration images; the camera
+                        matrix is rescaled for any other frame size
+            cache_file: Calibration file the maps are cached next to (None: memory only)
+        """
+        self.mtx = np.asarray(mtx, dtype=np.float64)
+        self.dist = np.asarray(dist, dtype=np.float64)
+        self.calib_size = calib_size or load_calibration_size(self.mtx, cache_file or "")
+        self.cache_file = cache_file
+        self._maps: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _key(self, size: Tuple[int, int]) -> str:
+        h = hashlib.sha1()
+        for part in (self.mtx, self.dist, np.array(self.calib_size), np.array(size)):
+            h.update(np.ascontiguousarray(part).tobytes())
+        return h.hexdigest()
+
+    def _maps_file(self, size: Tuple[int, int]) -> Optional[str]:
+        if not self.cache_file:
+            return None
+        return f"{os.path.splitext(self.cache_file)[0]}_maps_{size[0]}x{size[1]}.npz"
+
+    def _matrix(self, size: Tuple[int, int]) -> np.ndarray:
+        """Camera matrix scaled from the calibration resolution to a (width, height) frame"""
+        sx, sy = size[0] / self.calib_size[0], size[1] / self.calib_size[1]
+        return self.mtx * np.array([[sx], [sy], [1.0]])
+
+    def maps(self, size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Remap tables for a (width, height) frame size"""
+        if size in self._maps:
+            return self._maps[size]
+
+        key = self._key(size)
+        maps_file = self._maps_file(size)
+        if maps_file and os.path.isfile(maps_file):
+            with np.load(maps_file) as data:
+                if str(data["key"]) == key:
+                    self._maps[size] = (data["map1"], data["map2"])
+                    return self._maps[size]
+
+        mtx = self._matrix(size)
+        map1, map2 = cv2.initUndistortRectifyMap(mtx, self.dist, None, mtx, size, cv2.CV_16SC2)
+        self._maps[size] = (map1, map2)
+
+        if maps_file:
+            try:
+                np.savez(maps_file, map1=map1, map2=map2, key=key)
+            except OSError as e:
+                print(f"Could not cache undistortion maps: {str(e)}")
+        return map1, map2
+
+    def __call__(self, img: np.ndarray) -> np.ndarray:
+        map1, map2 = self.maps((img.shape[1], img.shape[0]))
+        return cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
+
+    def distort_boxes(self, boxes: List[Tuple[int, int, int, int]],
+                      size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        """
+        Map (x, y, w, h) boxes found on an undistorted (width, height) frame
+        back onto the raw frame: the bounding box of each box's distorted outline
+        """
+        if not boxes:
+            return []
+        mtx = self._matrix(size)
+        # Corners and edge midpoints, since straight edges bend under distortion
+        fx = np.array([0.0, 0.5, 1.0, 1.0, 1.0, 0.5, 0.0, 0.0])
+        fy = np.array([0.0, 0.0, 0.0, 0.5, 1.0, 1.0, 1.0, 0.5])
+        b = np.asarray(boxes, dtype=np.float64)
+        u = (b[:, :1] + fx * b[:, 2:3]).ravel()
+        v = (b[:, 1:2] + fy * b[:, 3:4]).ravel()
+        # Undistorted pixels -> normalized rays (the maps keep mtx as the new camera matrix) -> raw pixels
+        rays = np.stack([(u - mtx[0, 2]) / mtx[0, 0], (v - mtx[1, 2]) / mtx[1, 1], np.ones_like(u)], axis=1)
+        points, _ = cv2.projectPoints(rays, np.zeros(3), np.zeros(3), mtx, self.dist)
+        points = points.reshape(len(boxes), -1, 2)
+        low, high = points.min(axis=1), points.max(axis=1)
+        return [(int(x0), int(y0), int(round(x1 - x0)), int(round(y1 - y0)))
+                for (x0, y0), (x1, y1) in zip(low, high)]
+
+
+_undistorters: Dict[bytes, Undistorter] = {}
+
 def undistort_image(img, mtx, dist):
-    """Simple undistortion wrapper"""
-    return cv2.undistort(img, mtx, dist)
\ No newline at end of file
+    """Simple undistortion wrapper (remap with maps cached per calibration and size)"""
+    key = np.ascontiguousarray(mtx).tobytes() + np.ascontiguousarray(dist).tobytes()
+    if key not in _undistorters:
+        _undistorters[key] = Undistorter(mtx, dist)
+    return _undistorters[key](img)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+
+# 48x48 grayscale input shared by every backend
+INPUT_SIZE = 48
+DEFAULT_ONNX_PATH = "models/emotion.onnx"
+
+
+class DeepFaceEmotionModel:
+    """DeepFace's Keras facial expression model, run on a prepared batch"""
+
+    name = "deepface"
+
+    def __init__(self):
+        from deepface import DeepFace
+        try:
+            self.model = DeepFace.build_model("Emotion", task="facial_attribute")
+        except TypeError:
+            # Older DeepFace releases have no task argument
+            self.model = DeepFace.build_model("Emotion")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """(N, 48, 48) float32 gray in [0, 1] -> (N, 7) class scores"""
+        return np.asarray(self.model.model(batch[..., None], training=False), dtype=np.float32)
+
+
+class OnnxEmotionModel:
+    """
+    The same network exported to ONNX (see export_onnx), run with ONNX
+    Runtime when it is installed, else with OpenCV's DNN module. Both run
+    the whole batch in one call on the CPU without TensorFlow.
+    """
+
+    def __init__(self, path: str = DEFAULT_ONNX_PATH, runtime: str = "auto"):
+        """
+        Args:
+            path: Exported model, input (N, 1, 48, 48)
+            runtime: 'onnxruntime', 'opencv' or 'auto' (onnxruntime if importable)
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No ONNX emotion model at {path}")
+        self.path = path
+        self._session = self._net = None
+        if runtime in ("auto", "onnxruntime"):
+            try:
+                import onnxruntime as ort
+                self._session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+                self._input = self._session.get_inputs()[0].name
+            except ImportError:
+                if runtime == "onnxruntime":
+                    raise
+        if self._session is None:
+            import cv2
+            self._net = cv2.dnn.readNetFromONNX(path)
+        self.name = "onnxruntime" if self._session is not None else "opencv-dnn"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """(N, 48, 48) float32 gray in [0, 1] -> (N, 7) class scores"""
+        blob = np.ascontiguousarray(batch[:, None, :, :], dtype=np.float32)
+        if self._session is not None:
+            return np.asarray(self._session.run(None, {self._input: blob})[0], dtype=np.float32)
+        self._net.setInput(blob)
+        return np.asarray(self._net.forward(), dtype=np.float32).reshape(len(batch), -1)
+
+
+def load_emotion_model(backend: str = "auto", onnx_path: str = DEFAULT_ONNX_PATH):
+    """
+    Emotion model for a backend name.
+
+    Args:
+        backend: 'onnx', 'deepface', or 'auto' for ONNX when an exported
+                 model exists at onnx_path and DeepFace otherwise
+    """
+    if backend == "deepface" or (backend == "auto" and not os.path.isfile(onnx_path)):
+        return DeepFaceEmotionModel()
+    if backend in ("auto", "onnx"):
+        return OnnxEmotionModel(onnx_path)
+    raise ValueError(f"Unknown emotion backend '{backend}', expected 'auto', 'onnx' or 'deepface'")
+
+
+def export_onnx(path: str = DEFAULT_ONNX_PATH, opset: int = 13) -> str:
+    """
+    Export DeepFace's emotion model to ONNX with an NCHW input so OpenCV
+    DNN can read it too. Needs tf2onnx (export time only).
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    keras_model = DeepFaceEmotionModel().model.model
+    spec = (tf.TensorSpec((None, INPUT_SIZE, INPUT_SIZE, 1), tf.float32, name="input"),)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=opset,
+                               inputs_as_nchw=["input"], output_path=path)
+    return path
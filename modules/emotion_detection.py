@@ -1,64 +1,205 @@
 import cv2
+import threading
 import numpy as np
-from typing import Dict
-from collections import deque
-from deepface import DeepFace
+from typing import Dict, Hashable, List, Optional, Sequence
+from modules.emotion_backends import DEFAULT_ONNX_PATH, INPUT_SIZE, DeepFaceEmotionModel, load_emotion_model
+
+# Output order of DeepFace's facial expression model
+MODEL_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+_FEAR = MODEL_LABELS.index('fear')
+_SURPRISE = MODEL_LABELS.index('surprise')
+
+
+class EmotionSmoother:
+    """
+    Per-key (e.g. per-track) exponential moving average over emotion
+    probability vectors, held in one preallocated array with a row per key,
+    so one person's emotions never bleed into another's. The least recently
+    updated row is recycled when every row is taken.
+    """
+
+    def __init__(self, stability_window: int = 2, threshold: float = 0.4, capacity: int = 64):
+        """
+        Args:
+            stability_window: EMA span in updates (alpha = 2 / (window + 1))
+            threshold: Probability both fear and surprise must exceed for 'confused'
+            capacity: Initial number of rows; grows if one batch needs more
+        """
+        self.alpha = 2.0 / (stability_window + 1)
+        self.threshold = threshold
+        self._scores = np.zeros((capacity, len(MODEL_LABELS)), dtype=np.float32)
+        self._last_used = np.full(capacity, -1, dtype=np.int64)  # update tick per row, -1 when free
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Hashable] = [None] * capacity
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def _slot(self, key: Hashable) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = int(np.argmin(self._last_used))
+            if self._last_used[slot] == self._tick:
+                # Every row is in use by this very batch
+                slot = len(self._last_used)
+                self._grow()
+            elif self._last_used[slot] >= 0:
+                del self._slots[self._keys[slot]]
+            self._slots[key] = slot
+            self._keys[slot] = key
+            self._last_used[slot] = -1
+        return slot
+
+    def _grow(self):
+        capacity = len(self._last_used)
+        self._scores = np.concatenate([self._scores, np.zeros_like(self._scores)])
+        self._last_used = np.concatenate([self._last_used, np.full(capacity, -1, dtype=np.int64)])
+        self._keys.extend([None] * capacity)
+
+    def update(self, probs: np.ndarray, keys: Sequence[Hashable]) -> np.ndarray:
+        """Fold (N, 7) probabilities into each key's average; returns the smoothed rows"""
+        probs = np.asarray(probs, dtype=np.float32).reshape(len(keys), len(MODEL_LABELS))
+        with self._lock:
+            self._tick += 1
+            slots = np.empty(len(keys), dtype=np.intp)
+            for i, key in enumerate(keys):
+                slots[i] = self._slot(key)
+                fresh = self._last_used[slots[i]] < 0
+                self._last_used[slots[i]] = self._tick
+                if fresh:
+                    self._scores[slots[i]] = probs[i]
+            self._scores[slots] += self.alpha * (probs - self._scores[slots])
+            return self._scores[slots].copy()
+
+    def current(self, keys: Sequence[Hashable]) -> List[Optional[np.ndarray]]:
+        """Current average per key (None for keys never seen)"""
+        with self._lock:
+            return [self._scores[self._slots[k]].copy() if k in self._slots else None for k in keys]
+
+    def forget(self, keys: Sequence[Hashable]):
+        """Free the rows of keys that will not be seen again (e.g. dropped tracks)"""
+        with self._lock:
+            for key in keys:
+                slot = self._slots.pop(key, None)
+                if slot is not None:
+                    self._last_used[slot] = -1
+
+    def labels(self, scores: np.ndarray) -> List[str]:
+        """Dominant emotion per row of (N, 7) probabilities, with the confused rule applied"""
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1, len(MODEL_LABELS))
+        best = np.argmax(scores, axis=1)
+        confused = (scores[:, _FEAR] > self.threshold) & (scores[:, _SURPRISE] > self.threshold)
+        return ['confused' if c else MODEL_LABELS[b] for b, c in zip(best, confused)]
+
+    def __call__(self, probs: np.ndarray, keys: Optional[Sequence[Hashable]] = None) -> List[str]:
+        """
+        Smoothed labels for one batch of faces. Without keys only the first
+        (largest) face is smoothed, as a single stream.
+        """
+        if len(probs) == 0:
+            return []
+        if keys is None:
+            probs = np.array(probs, dtype=np.float32)
+            probs[:1] = self.update(probs[:1], [None])
+            return self.labels(probs)
+        return self.labels(self.update(probs, keys))
+
+    def fallback(self, count: int, keys: Optional[Sequence[Hashable]] = None) -> List[str]:
+        """Labels when classification failed: each key keeps its last label"""
+        if keys is None:
+            keys = [None] + [object()] * (count - 1)
+        return [self.labels(s)[0] if s is not None else 'neutral' for s in self.current(keys)]
+
 
 class EmotionDetector:
-    def __init__(self, threshold: float = 0.4, stability_window: int = 2):
+    def __init__(self, threshold: float = 0.4, stability_window: int = 2, capacity: int = 64,
+                 backend: str = "auto", onnx_path: str = DEFAULT_ONNX_PATH):
         """
         Args:
             threshold: Confidence threshold for emotion detection
             stability_window: Number of frames to consider for stable emotion
+            capacity: Tracks whose emotion history is kept before the oldest is recycled
+            backend: Model for crops: 'onnx' (exported model via ONNX Runtime or
+                     OpenCV DNN), 'deepface' (Keras), or 'auto' (ONNX if exported)
+            onnx_path: Exported model used by the ONNX backend
         """
         self.emotions = ['happy', 'sad', 'neutral', 'angry', 'fear', 'surprise', 'confused']
         self.threshold = threshold
         self.stability_window = stability_window
-        self.emotion_history = deque(maxlen=stability_window)
+        self.smoother = EmotionSmoother(stability_window, threshold, capacity)
         self.current_stable_emotion = 'neutral'
+        self.backend = backend
+        self.onnx_path = onnx_path
+        self._model = None
 
     def detect(self, img: np.ndarray) -> Dict:
         """
         Returns dictionary with 'dominant' emotion key
         (maintains compatibility with existing main.py)
         """
+        # Convert color space if needed
+        if len(img.shape) == 3 and img.shape[2] == 3:
+            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        else:
+            img_rgb = img
         try:
-            # Convert color space if needed
-            if len(img.shape) == 3 and img.shape[2] == 3:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                img_rgb = img
-
+            from deepface import DeepFace
             # Perform emotion analysis
             result = DeepFace.analyze(
                 img_path=img_rgb,
                 actions=['emotion'],
+                detector_backend="opencv",
                 enforce_detection=False,
                 silent=True
             )
 
             if isinstance(result, list):
-                scores = result[0]['emotion']
-                current_emo = result[0]['dominant_emotion']
-                
-                # Special handling for confused state
-                if (scores['fear'] > self.threshold and 
-                    scores['surprise'] > self.threshold):
-                    current_emo = 'confused'
-                
-                # Update emotion history
-                self.emotion_history.append(current_emo)
-                
-                # Determine most frequent emotion in history
-                if len(self.emotion_history) == self.stability_window:
-                    counts = {}
-                    for emo in self.emotion_history:
-                        counts[emo] = counts.get(emo, 0) + 1
-                    self.current_stable_emotion = max(counts.items(), key=lambda x: x[1])[0]
-                
-                return {'dominant': self.current_stable_emotion}
-                
+                # analyze reports percentages; keep the full vector for smoothing
+                self.smooth(np.array([[result[0]['emotion'][label] / 100.0 for label in MODEL_LABELS]]))
+
         except Exception as e:
             print(f"[EMOTION] Error: {str(e)}")
-        
-        return {'dominant': self.current_stable_emotion}
\ No newline at end of file
+
+        return {'dominant': self.current_stable_emotion}
+
+    def classify(self, faces: List[np.ndarray]) -> np.ndarray:
+        """Per-class probabilities (N, 7), in MODEL_LABELS order, for aligned face crops"""
+        probs = self._predict(faces)
+        return probs / np.maximum(probs.sum(axis=1, keepdims=True), 1e-12)
+
+    def smooth(self, probs: np.ndarray, keys: Optional[Sequence[Hashable]] = None) -> List[str]:
+        """Labels for classify() output after per-key temporal smoothing (see EmotionSmoother)"""
+        emotions = self.smoother(probs, keys)
+        if keys is None and emotions:
+            self.current_stable_emotion = emotions[0]
+        return emotions
+
+    def _predict(self, faces: List[np.ndarray]) -> np.ndarray:
+        """Raw class probabilities for BGR or gray face crops, one row per face"""
+        batch = np.empty((len(faces), INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        for i, face in enumerate(faces):
+            gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+            batch[i] = cv2.resize(gray, (INPUT_SIZE, INPUT_SIZE)) / 255.0
+        model = self._get_model()
+        try:
+            return model.predict(batch)
+        except Exception as e:
+            if isinstance(model, DeepFaceEmotionModel):
+                raise
+            print(f"[EMOTION] {model.name} backend failed ({str(e)}), falling back to DeepFace")
+            self._model = DeepFaceEmotionModel()
+            return self._model.predict(batch)
+
+    def warm_up(self):
+        """Build the emotion model with one dummy crop, leaving the emotion history untouched"""
+        self._predict([np.zeros((48, 48), dtype=np.uint8)])
+
+    def _get_model(self):
+        if self._model is None:
+            try:
+                self._model = load_emotion_model(self.backend, self.onnx_path)
+            except Exception as e:
+                if self.backend == "deepface":
+                    raise
+                print(f"[EMOTION] Could not load the {self.backend} backend ({str(e)}), using DeepFace")
+                self._model = DeepFaceEmotionModel()
+        return self._model
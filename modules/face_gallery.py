@@ -0,0 +1,448 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+from modules.face_index import AppendBuffer, build_index, similarity_matrix
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# On-disk gallery layout; bump the version when the header or matrix layout changes
+GALLERY_FORMAT = "face-gallery"
+GALLERY_VERSION = 1
+
+
+def l2_normalize(x: np.ndarray) -> np.ndarray:
+    """L2-normalize a vector or each row of a matrix (float32)"""
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _object_array(values) -> np.ndarray:
+    """1-D object array of strings (np.asarray would make a fixed-width str array)"""
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+
+def representations_file(db_path: str, model_name: str, detector_backend: str) -> str:
+    """Path of the DeepFace representations pickle for a model/detector combo"""
+    name = f"ds_model_{model_name}_detector_{detector_backend}_aligned_normalization_base_expand_0.pkl"
+    return os.path.join(db_path, name.replace("-", "").lower())
+
+
+def gallery_file(db_path: str, model_name: str, detector_backend: str) -> str:
+    """Path of the gallery header (JSON sidecar of the .npy matrix) for a model/detector combo"""
+    name = f"gallery_{model_name}_{detector_backend}.json"
+    return os.path.join(db_path, name.replace("-", "").lower())
+
+
+def journal_file(header_path: str) -> str:
+    """Append-only file enrollments go to until they are folded into the gallery"""
+    return os.path.splitext(header_path)[0] + ".journal"
+
+
+def lock_file(header_path: str) -> str:
+    """Lock file serializing processes that rewrite a gallery or its journal"""
+    return os.path.splitext(header_path)[0] + ".lock"
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive advisory lock on path across processes (blocks until acquired)"""
+    with open(path, 'a') as f:
+        try:
+            import fcntl
+        except ImportError:
+            # Windows: lock the first byte; LK_LOCK gives up after ~10 s, so keep retrying
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def make_representation(path: str, embedding, area: dict) -> dict:
+    """DeepFace-format record for one image and its embedding"""
+    stats = os.stat(path)
+    return {
+        'identity': path,
+        'hash': hashlib.sha1(
+            f"{stats.st_size}-{stats.st_ctime}-{stats.st_mtime}".encode("utf-8")
+        ).hexdigest(),
+        'embedding': [float(v) for v in embedding],
+        'target_x': int(area['x']),
+        'target_y': int(area['y']),
+        'target_w': int(area['w']),
+        'target_h': int(area['h'])
+    }
+
+
+def append_representations(header_path: str, records: List[dict]):
+    """
+    Durably append records to the journal of a gallery, one JSON line per
+    record, so a crash mid-write loses at most the torn last line.
+    """
+    # Under the gallery lock so a concurrent load never folds and deletes a half-written journal
+    with _file_lock(lock_file(header_path)), open(journal_file(header_path), 'a') as f:
+        f.write("".join(json.dumps(r) + "\n" for r in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_journal(path: str) -> List[dict]:
+    records = []
+    if not os.path.isfile(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn final line from an interrupted enrollment
+                print(f"[GALLERY] Ignoring truncated journal line in {path}")
+                break
+    return records
+
+
+def _image_paths(db_path: str) -> List[str]:
+    """Every gallery image under db_path/<user>/, relative to db_path"""
+    return sorted(
+        os.path.relpath(os.path.join(root, f), db_path)
+        for root, _, files in os.walk(db_path)
+        for f in files if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _replace_file(path: str, write):
+    """Write through a temporary file and rename it over path, so readers never see a partial file"""
+    # Per-process name: pool workers may rebuild the same gallery concurrently
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class FaceGallery:
+    """
+    Resident face database: one contiguous matrix of L2-normalized
+    embeddings (float32, or float16 as stored) plus a label per row.
+    Nearest-row lookups go through a pluggable index (modules.face_index):
+    an exact scan for small galleries, IVF for large ones.
+
+    On disk the matrix is a .npy file opened with np.memmap, so loading is
+    near-instant and worker processes share its pages, next to a JSON
+    header with labels, identities and the settings the embeddings were
+    computed with (see GALLERY_VERSION).
+    """
+
+    def __init__(self, embeddings: np.ndarray, labels, identities: Optional[List[str]] = None,
+                 index: str = "auto", normalized: bool = False):
+        """
+        Args:
+            index: 'auto', 'brute' or 'ivf' (see face_index.build_index)
+            normalized: Rows are already L2-normalized float32 or float16 (kept as-is, e.g. a memmap)
+        """
+        if not normalized or embeddings.dtype not in (np.float32, np.float16):
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(labels):
+            embeddings = embeddings.reshape(len(labels), -1)
+        else:
+            # An empty database may not know its embedding width yet
+            embeddings = embeddings.reshape(0, embeddings.shape[-1] if embeddings.ndim == 2 else 0)
+        self.embeddings = embeddings if normalized else np.ascontiguousarray(l2_normalize(embeddings))
+        # Rows, labels and identities live in buffers that extend() appends to in place
+        self._rows = AppendBuffer(self.embeddings)
+        self._labels = AppendBuffer(_object_array(labels))
+        if identities is None:
+            identities = [''] * len(labels)
+        self._identities = AppendBuffer(_object_array(identities))
+        self.labels = self._labels.data
+        self.identities = self._identities.data
+        self._groups = None
+        self.index_kind = index
+        self.index = build_index(self.embeddings, index)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @classmethod
+    def from_representations(cls, representations: List[dict], index: str = "auto") -> "FaceGallery":
+        """Build from DeepFace-style records with 'identity' and 'embedding' keys"""
+        identities = [r['identity'] for r in representations]
+        labels = [os.path.basename(os.path.dirname(i)) for i in identities]
+        embeddings = np.array([r['embedding'] for r in representations], dtype=np.float32)
+        return cls(embeddings, labels, identities, index)
+
+    @classmethod
+    def load(cls, db_path: str = "data/faces", model_name: str = "Facenet",
+             detector_backend: str = "retinaface", index: str = "auto",
+             dtype: str = "float32") -> "FaceGallery":
+        """
+        Open the gallery of db_path, memory-mapped. A missing or stale
+        gallery (other format version or embedding settings) is rebuilt,
+        from the DeepFace pickle when one exists. Journaled enrollments are
+        folded in, rows of deleted images dropped and images added by hand
+        embedded, and the result is saved back. The whole load holds the
+        gallery's lock file, so concurrent loaders (e.g. pool workers) never
+        race on the rebuild, journal removal or pruning of old generations.
+
+        Args:
+            dtype: Storage type when the gallery is (re)written: 'float32'
+                   or 'float16' (half the size and page cache; it stays mapped
+                   as float16 and is upcast a block at a time when searched)
+        """
+        header_path = gallery_file(db_path, model_name, detector_backend)
+        settings = {
+            'format': GALLERY_FORMAT,
+            'version': GALLERY_VERSION,
+            'model_name': model_name,
+            'detector_backend': detector_backend,
+            'align': True,
+            'normalization': 'base'
+        }
+        # Inference workers load the same gallery at once: one of them reconciles and saves
+        # while the others wait, then find it current and only map it
+        with _file_lock(lock_file(header_path)):
+            gallery, reason = cls._open(header_path, settings, db_path, index)
+            changed = gallery is None
+            if gallery is None:
+                print(f"[GALLERY] Rebuilding {header_path}: {reason}")
+                representations = []
+                pkl_path = representations_file(db_path, model_name, detector_backend)
+                if os.path.isfile(pkl_path):
+                    # One-time migration; only the repo's own pickle is ever unpickled
+                    with open(pkl_path, 'rb') as f:
+                        representations = pickle.load(f)
+                    # DeepFace stores paths as given at build time; re-root them at db_path
+                    for r in representations:
+                        r['identity'] = os.path.join(db_path, os.path.basename(os.path.dirname(r['identity'])),
+                                                     os.path.basename(r['identity']))
+                gallery = cls.from_representations(representations, index)
+
+            # Reconcile with the images actually on disk and pending enrollments
+            on_disk = set(_image_paths(db_path))
+            known = [os.path.relpath(i, db_path) for i in gallery.identities]
+            known_set = set(known)
+            keep = [row for row, rel in enumerate(known) if rel in on_disk]
+            journal = {os.path.relpath(r['identity'], db_path): r for r in _read_journal(journal_file(header_path))}
+            journal = {rel: r for rel, r in journal.items() if rel in on_disk and rel not in known_set}
+            new = sorted(on_disk - known_set - set(journal))
+            if len(keep) < len(known) or journal or new:
+                print(f"[GALLERY] {len(known) - len(keep)} removed, {len(journal)} enrolled, "
+                      f"{len(new)} new images since the last save")
+                added = list(journal.values()) + cls._build_representations(db_path, model_name, detector_backend, new)
+                gallery = gallery.subset(keep)
+                if added:
+                    gallery = gallery.extend(
+                        np.array([r['embedding'] for r in added], dtype=np.float32),
+                        [os.path.basename(os.path.dirname(r['identity'])) for r in added],
+                        [r['identity'] for r in added]
+                    )
+                changed = True
+
+            if changed:
+                gallery.save(header_path, settings, db_path, dtype)
+            if os.path.isfile(journal_file(header_path)):
+                os.remove(journal_file(header_path))
+        print(f"[GALLERY] Loaded {len(gallery)} embeddings from {header_path}")
+        return gallery
+
+    @classmethod
+    def _open(cls, header_path: str, settings: dict, db_path: str,
+              index: str) -> Tuple[Optional["FaceGallery"], str]:
+        """(gallery, '') for a current gallery file, else (None, why it cannot be used)"""
+        if not os.path.isfile(header_path):
+            return None, "no gallery file yet"
+        try:
+            with open(header_path) as f:
+                header = json.load(f)
+        except (OSError, ValueError) as e:
+            return None, f"unreadable header ({str(e)})"
+        for key, value in settings.items():
+            if header.get(key) != value:
+                return None, f"{key} is {header.get(key)!r}, expected {value!r}"
+
+        try:
+            data_path = os.path.join(os.path.dirname(header_path), header['data'])
+            # Zero-length files cannot be mapped
+            embeddings = np.load(data_path, mmap_mode='r' if header['count'] else None)
+        except (OSError, ValueError, KeyError) as e:
+            return None, f"unreadable data ({str(e)})"
+        if embeddings.shape != (header['count'], header['dim']) or len(header['labels']) != header['count']:
+            return None, "data does not match its header"
+        identities = [os.path.join(db_path, rel) for rel in header['identities']]
+        return cls(embeddings, header['labels'], identities, index, normalized=True), ''
+
+    def save(self, header_path: str, settings: dict, db_path: str, dtype: str = "float32"):
+        """
+        Write the matrix to a new .npy file, then atomically replace the
+        header pointing at it; processes still mapping the old file keep
+        working, and a crash at any point leaves the previous gallery intact.
+        """
+        data = np.ascontiguousarray(self.embeddings, dtype=dtype)
+        stem = os.path.splitext(os.path.basename(header_path))[0]
+        data_name = f"{stem}.{hashlib.sha1(data.tobytes()).hexdigest()[:12]}.npy"
+        folder = os.path.dirname(header_path)
+        _replace_file(os.path.join(folder, data_name), lambda f: np.save(f, data))
+
+        header = dict(settings, l2_normalized=True, dtype=dtype, dim=int(self.embeddings.shape[1]),
+                      count=len(self), data=data_name, labels=[str(label) for label in self.labels],
+                      identities=[os.path.relpath(i, db_path) for i in self.identities])
+        _replace_file(header_path, lambda f: f.write(json.dumps(header).encode("utf-8")))
+
+        # Older generations are no longer referenced (mapped copies stay valid on POSIX)
+        for fname in os.listdir(folder or "."):
+            if fname.startswith(stem + ".") and fname.endswith(".npy") and fname != data_name:
+                try:
+                    os.remove(os.path.join(folder, fname))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _build_representations(db_path: str, model_name: str, detector_backend: str,
+                               paths: List[str]) -> List[dict]:
+        """Embed the given images (relative to db_path) with DeepFace"""
+        if not paths:
+            return []
+        from deepface import DeepFace
+
+        representations = []
+        for rel in paths:
+            path = os.path.join(db_path, rel)
+            try:
+                obj = DeepFace.represent(
+                    img_path=path,
+                    model_name=model_name,
+                    detector_backend=detector_backend,
+                    enforce_detection=False,
+                    align=True
+                )[0]
+            except Exception as e:
+                print(f"[GALLERY] Skipping {path}: {str(e)}")
+                continue
+            representations.append(make_representation(path, obj['embedding'], obj['facial_area']))
+        return representations
+
+    def subset(self, rows: List[int]) -> "FaceGallery":
+        """New gallery with only the given rows (the index is rebuilt)"""
+        if len(rows) == len(self):
+            return self
+        rows = np.asarray(rows, dtype=np.intp)
+        return FaceGallery(np.asarray(self.embeddings[rows]).reshape(len(rows), self.dim), self.labels[rows],
+                           self.identities[rows], self.index_kind, normalized=True)
+
+    def extend(self, embeddings: np.ndarray, labels: List[str], identities: List[str]) -> "FaceGallery":
+        """
+        New gallery with rows appended; this one stays valid for readers still
+        holding it. The rows go into the spare capacity of the shared buffers
+        and into the existing index (no IVF retraining), so appending k rows
+        costs O(k) amortized, not a copy of the whole gallery.
+        """
+        n, k = len(self), len(labels)
+        embeddings = l2_normalize(np.asarray(embeddings, dtype=np.float32).reshape(k, -1))
+        gallery = FaceGallery.__new__(FaceGallery)
+        gallery._rows = self._rows.append(n, embeddings)
+        gallery._labels = self._labels.append(n, _object_array(labels))
+        gallery._identities = self._identities.append(n, _object_array(identities))
+        gallery.embeddings = gallery._rows.data[:n + k]
+        gallery.labels = gallery._labels.data[:n + k]
+        gallery.identities = gallery._identities.data[:n + k]
+        gallery._groups = None
+        gallery.index_kind = self.index_kind
+        gallery.index = self.index.extended(gallery.embeddings)
+        return gallery
+
+    def similarities(self, embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of one query against every gallery row"""
+        return similarity_matrix(l2_normalize(embedding).reshape(1, -1), self.embeddings)[0]
+
+    def _grouping(self):
+        """(names, rows per name, rows grouped by name, group starts), built on first use"""
+        if self._groups is None:
+            # Integer label per row so per-identity aggregation stays vectorized
+            names, label_ids = np.unique(self.labels.astype(str), return_inverse=True)
+            counts = np.bincount(label_ids, minlength=len(names)).astype(np.float32)
+            # Rows grouped by identity so per-identity reductions are one reduceat call
+            order = np.argsort(label_ids, kind='stable')
+            starts = np.concatenate(([0], np.cumsum(counts[:-1]))).astype(np.intp)
+            self._groups = (names, counts, order, starts)
+        return self._groups
+
+    def _aggregate(self, sims: np.ndarray, aggregate: Optional[str]):
+        """Reduce per-image similarities (..., N) to per-candidate scores and their names"""
+        if aggregate is None:
+            return sims, self.labels
+        names, counts, order, starts = self._grouping()
+        if aggregate == 'max':
+            return np.maximum.reduceat(sims[..., order], starts, axis=-1), names
+        if aggregate == 'mean':
+            return np.add.reduceat(sims[..., order], starts, axis=-1) / counts, names
+        raise ValueError(f"Unknown aggregate '{aggregate}', expected None, 'mean' or 'max'")
+
+    def match(self, embedding: np.ndarray, top_k: int = 1,
+              aggregate: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Return the top_k (label, cosine similarity) pairs, best first.
+
+        Args:
+            embedding: Query embedding (need not be normalized)
+            top_k: Number of candidates to return
+            aggregate: None to rank individual images, or 'mean'/'max'
+                       to rank identities by the mean/max over their images
+        """
+        if len(self) == 0:
+            return []
+
+        if aggregate is None:
+            scores, rows = self.index.search(l2_normalize(embedding).reshape(1, -1), top_k)
+            return [(str(self.labels[r]), float(sc)) for sc, r in zip(scores[0], rows[0]) if r >= 0]
+
+        scores, names = self._aggregate(self.similarities(embedding), aggregate)
+        k = min(top_k, len(scores))
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return [(str(names[i]), float(scores[i])) for i in idx]
+
+    def match_batch(self, embeddings: np.ndarray,
+                    aggregate: Optional[str] = None) -> List[Tuple[Optional[str], float]]:
+        """
+        Best (label, cosine similarity) for each row of a query matrix in one
+        product; (None, 0.0) for every row when the gallery is empty
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(self) == 0 or len(embeddings) == 0:
+            return [(None, 0.0)] * len(embeddings)
+
+        if aggregate in (None, 'max'):
+            # The best identity by max is the label of the best single row
+            scores, rows = self.index.search(l2_normalize(embeddings), 1)
+            return [(str(self.labels[r]), float(sc)) if r >= 0 else (None, 0.0)
+                    for sc, r in zip(scores[:, 0], rows[:, 0])]
+
+        scores, names = self._aggregate(similarity_matrix(l2_normalize(embeddings), self.embeddings), aggregate)
+        best = np.argmax(scores, axis=1)
+        return [(str(names[i]), float(scores[row, i])) for row, i in enumerate(best)]
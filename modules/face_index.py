@@ -0,0 +1,246 @@
+import threading
+import numpy as np
+from typing import Optional, Tuple
+
+# Galleries at least this large get an IVF index under index="auto"
+AUTO_IVF_MIN_SIZE = 20000
+# Rows appended to an IVF index are scanned from an unsorted tail until it
+# outgrows this fraction of the clustered rows (and IVF_TAIL_MIN_ROWS); then
+# the lists are rebuilt, so appending stays amortized O(1) per row
+IVF_TAIL_FRACTION = 0.1
+IVF_TAIL_MIN_ROWS = 1024
+# Gallery rows stored below float32 (e.g. a float16 memmap) are upcast this
+# many at a time, so a search never materializes a float32 copy of the gallery
+UPCAST_BLOCK_ROWS = 16384
+
+
+def similarity_matrix(queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """(M, N) float32 products of (M, D) float32 queries with (N, D) rows of any float dtype"""
+    if rows.dtype == np.float32:
+        return queries @ rows.T
+    sims = np.empty((len(queries), len(rows)), dtype=np.float32)
+    for start in range(0, len(rows), UPCAST_BLOCK_ROWS):
+        block = rows[start:start + UPCAST_BLOCK_ROWS]
+        sims[:, start:start + len(block)] = queries @ block.astype(np.float32).T
+    return sims
+
+
+class AppendBuffer:
+    """
+    Over-allocated array shared by successive snapshots (galleries, indexes):
+    each snapshot keeps its own length and reads data[:length]. Appending at
+    the newest length writes into spare capacity, doubling it when full;
+    appending at an older length copies, so no snapshot ever sees its rows change.
+    """
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.used = len(data)
+        self._lock = threading.Lock()
+
+    def append(self, length: int, values: np.ndarray) -> "AppendBuffer":
+        """Buffer holding data[:length] followed by values"""
+        end = length + len(values)
+        with self._lock:
+            if length == self.used and end <= len(self.data) and self.data.flags.writeable:
+                self.used = end
+                self.data[length:end] = values
+                return self
+        data = np.empty((max(16, 2 * end),) + values.shape[1:], dtype=self.data.dtype)
+        if length:
+            data[:length] = self.data[:length]
+        data[length:end] = values
+        buffer = AppendBuffer(data)
+        buffer.used = end
+        return buffer
+
+
+class BruteForceIndex:
+    """Exact search: one product of the queries against every gallery row"""
+
+    def __init__(self, embeddings: np.ndarray):
+        """
+        Args:
+            embeddings: (N, D) L2-normalized gallery rows, float32 or float16 (not copied)
+        """
+        self.embeddings = embeddings
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k cosine similarities and row numbers for (M, D) normalized
+        queries, best first; both (M, k) with rows -1 past the gallery size
+        """
+        return _top_k(similarity_matrix(queries, self.embeddings), k)
+
+    def extended(self, embeddings: np.ndarray) -> "BruteForceIndex":
+        """Index over embeddings, a superset of this index's rows with new ones appended"""
+        return BruteForceIndex(embeddings)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are clustered with spherical k-means and a
+    query is compared only with the rows of its nprobe closest clusters,
+    then the candidates are ranked exactly. Cost per query is about
+    nlist + N * nprobe / nlist dot products instead of N.
+    """
+
+    def __init__(self, embeddings: np.ndarray, nlist: Optional[int] = None, nprobe: int = 32,
+                 iterations: int = 10, seed: int = 0, centroids: Optional[np.ndarray] = None):
+        """
+        Args:
+            embeddings: (N, D) L2-normalized gallery rows; the index keeps
+                        a second, cluster-ordered copy for contiguous probing
+            nlist: Clusters (default about 2 * sqrt(N))
+            nprobe: Clusters searched per query; higher trades speed for recall
+            iterations: k-means iterations
+            centroids: Reuse trained centroids instead of running k-means
+        """
+        self.embeddings = embeddings
+        self.nprobe = nprobe
+        if centroids is None:
+            nlist = nlist or max(1, int(2 * np.sqrt(len(embeddings))))
+            centroids = _spherical_kmeans(embeddings, min(nlist, len(embeddings)), iterations, seed)
+        self.centroids = centroids
+        self._build_lists(_assign(embeddings, centroids))
+
+    def _build_lists(self, assignments: np.ndarray):
+        self.assignments = assignments
+        # Cluster of each row appended since, past len(assignments) (see extended)
+        self._tail = AppendBuffer(np.empty(0, dtype=np.intp))
+        # Row numbers grouped by cluster; cluster c owns rows[offsets[c]:offsets[c + 1]]
+        self._rows = np.argsort(assignments, kind='stable').astype(np.intp)
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))))
+        # Rows copied in cluster order so probing a list reads one contiguous block
+        self._vectors = np.ascontiguousarray(self.embeddings[self._rows])
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as BruteForceIndex.search, approximately"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.embeddings.shape[1])
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.intp)
+        if len(self) == 0:
+            return scores, rows
+
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        listed = len(self.assignments)
+        tail = self._tail.data[:len(self) - listed]
+        for q, (query, clusters) in enumerate(zip(queries, probes)):
+            spans = [(self._offsets[c], self._offsets[c + 1]) for c in clusters]
+            extra = listed + np.flatnonzero(np.isin(tail, clusters))
+            candidates = np.concatenate([self._rows[a:b] for a, b in spans] + [extra])
+            if len(candidates) == 0:
+                continue
+            sims = np.concatenate([self._vectors[a:b] @ query for a, b in spans] + [self.embeddings[extra] @ query])
+            top_scores, top = _top_k(sims[None, :], k)
+            n = top.shape[1]
+            scores[q, :n] = top_scores[0]
+            rows[q, :n] = np.where(top[0] >= 0, candidates[np.maximum(top[0], 0)], -1)
+        return scores, rows
+
+    def extended(self, embeddings: np.ndarray) -> "IVFIndex":
+        """
+        Index over embeddings, a superset of this index's rows with new ones
+        appended. New rows join the existing clusters without retraining:
+        they go to an unsorted tail that is folded into the cluster lists
+        once it outgrows IVF_TAIL_FRACTION of them, so this costs amortized
+        O(new rows) and this index stays valid for readers still holding it.
+        """
+        if self.nlist == 0:
+            # Nothing to assign to yet: train on what there is now
+            return IVFIndex(embeddings, nprobe=self.nprobe)
+        index = IVFIndex.__new__(IVFIndex)
+        index.embeddings = embeddings
+        index.nprobe = self.nprobe
+        index.centroids = self.centroids
+        listed = len(self.assignments)
+        tail = len(self) - listed
+        new = _assign(embeddings[len(self):], self.centroids)
+        if tail + len(new) > max(IVF_TAIL_MIN_ROWS, IVF_TAIL_FRACTION * listed):
+            index._build_lists(np.concatenate([self.assignments, self._tail.data[:tail], new]))
+        else:
+            index.assignments, index._rows, index._offsets, index._vectors = (
+                self.assignments, self._rows, self._offsets, self._vectors)
+            index._tail = self._tail.append(tail, new)
+        return index
+
+
+def build_index(embeddings: np.ndarray, kind: str = "auto", **kwargs):
+    """
+    Index over L2-normalized gallery rows.
+
+    Args:
+        kind: 'brute' for exact search, 'ivf' for the approximate index, or
+              'auto' for IVF from AUTO_IVF_MIN_SIZE rows on
+        kwargs: Passed to IVFIndex
+    """
+    if kind == "auto":
+        kind = "ivf" if len(embeddings) >= AUTO_IVF_MIN_SIZE else "brute"
+    if kind == "brute":
+        return BruteForceIndex(embeddings)
+    if kind == "ivf":
+        return IVFIndex(embeddings, **kwargs)
+    raise ValueError(f"Unknown index '{kind}', expected 'auto', 'brute' or 'ivf'")
+
+
+def _top_k(sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k columns per row of a similarity matrix, sorted, padded with (-inf, -1)"""
+    m, n = sims.shape
+    scores = np.full((m, k), -np.inf, dtype=np.float32)
+    rows = np.full((m, k), -1, dtype=np.intp)
+    kk = min(k, n)
+    if kk == 0:
+        return scores, rows
+    if kk == 1:
+        top = np.argmax(sims, axis=1)[:, None]
+    else:
+        top = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+    scores[:, :kk] = np.take_along_axis(sims, top, axis=1)
+    rows[:, :kk] = top
+    return scores, rows
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """Closest centroid per row, in chunks to bound the similarity matrix"""
+    assignments = np.empty(len(embeddings), dtype=np.intp)
+    for start in range(0, len(embeddings), chunk):
+        assignments[start:start + chunk] = np.argmax(embeddings[start:start + chunk] @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(embeddings: np.ndarray, k: int, iterations: int, seed: int,
+                      max_train: int = 256) -> np.ndarray:
+    """Unit-norm centroids trained on at most max_train rows per cluster"""
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    if n == 0:
+        return np.empty((0, embeddings.shape[1]), dtype=np.float32)
+    sample = embeddings[np.sort(rng.choice(n, min(n, k * max_train), replace=False))].astype(np.float32)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts[:-1])))
+        empty = counts == 0
+        # Per-cluster sums in one pass over the rows sorted by cluster
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[np.argsort(assignments, kind='stable')], starts[~empty], axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+        # Restart empty clusters on random rows
+        if empty.any():
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32)
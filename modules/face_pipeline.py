@@ -0,0 +1,165 @@
+import numpy as np
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+from modules.metrics import StageTimer
+
+
+class DetectedFace(NamedTuple):
+    crop: np.ndarray                  # aligned face, BGR uint8
+    box: Tuple[int, int, int, int]    # x, y, w, h in the source frame
+    landmarks: Dict[str, Tuple[int, int]]
+    confidence: float
+
+
+class FaceResult(NamedTuple):
+    box: Tuple[int, int, int, int]
+    name: Optional[str]
+    confidence: float
+    emotion: str
+
+
+def to_bgr_crop(face: np.ndarray) -> np.ndarray:
+    """Aligned face from DeepFace.extract_faces (RGB in [0, 1]) as a BGR uint8 crop, like frames"""
+    return np.ascontiguousarray((face[:, :, ::-1] * 255).astype(np.uint8))
+
+
+class FacePipeline:
+    """
+    Single-pass detect -> align -> (embed, emotion) stage. Faces are detected
+    and aligned once per frame and the same crops feed both the identity
+    embedder and the emotion classifier.
+    """
+
+    def __init__(self, recognizer, emotion_detector, detector_backend: Optional[str] = None,
+                 align: bool = True, max_faces: Optional[int] = None,
+                 timer: Optional[StageTimer] = None):
+        """
+        Args:
+            recognizer: FaceRecognizer used for embedding + gallery matching
+            emotion_detector: EmotionDetector used on the aligned crops
+            detector_backend: Defaults to the recognizer's detector so crops
+                              match the ones the gallery was built from
+            max_faces: Keep only the largest N faces (None for all)
+            timer: Receives detect/embed/match/emotion stage timings
+        """
+        self.recognizer = recognizer
+        self.emotion_detector = emotion_detector
+        self.detector_backend = detector_backend or recognizer.detector_backend
+        self.align = align
+        self.max_faces = max_faces
+        self.timer = timer or StageTimer()
+
+    def detect(self, img: np.ndarray) -> List[DetectedFace]:
+        """Detect and align faces in a BGR frame, largest first"""
+        try:
+            from deepface import DeepFace
+            with self.timer.time('detect'):
+                objs = DeepFace.extract_faces(
+                    img_path=img,
+                    detector_backend=self.detector_backend,
+                    enforce_detection=False,
+                    align=self.align
+                )
+        except Exception as e:
+            print(f"[PIPELINE] Detection error: {str(e)}")
+            return []
+
+        faces = []
+        for obj in objs:
+            # With enforce_detection=False DeepFace returns the whole frame
+            # with zero confidence when nothing is found
+            if not obj.get('confidence'):
+                continue
+            area = obj['facial_area']
+            crop = to_bgr_crop(obj['face'])
+            landmarks = {k: tuple(area[k]) for k in ('left_eye', 'right_eye') if area.get(k)}
+            faces.append(DetectedFace(
+                crop=crop,
+                box=(int(area['x']), int(area['y']), int(area['w']), int(area['h'])),
+                landmarks=landmarks,
+                confidence=float(obj['confidence'])
+            ))
+
+        faces.sort(key=lambda f: f.box[2] * f.box[3], reverse=True)
+        if self.max_faces:
+            faces = faces[:self.max_faces]
+        self.timer.add('faces', len(faces))
+        return faces
+
+    def warm_up(self, frame_shape: Tuple[int, int, int], timer: Optional[StageTimer] = None):
+        """
+        Import DeepFace and run every model once on dummy input, so graph
+        construction happens before the first real frame instead of on it.
+
+        Args:
+            frame_shape: (height, width, 3) of the frames detect() will see
+            timer: Receives the import and per-model warm-up times
+        """
+        timer = timer or StageTimer()
+        # Keep the dummy passes out of the live per-stage timings
+        live_timer, self.timer = self.timer, StageTimer()
+        try:
+            with timer.time('import_deepface'):
+                import deepface  # noqa: F401
+            with timer.time('warmup_detect'):
+                self.detect(np.zeros(frame_shape, dtype=np.uint8))
+            with timer.time('warmup_embed'):
+                self.recognizer.warm_up()
+            with timer.time('warmup_emotion'):
+                self.emotion_detector.warm_up()
+        finally:
+            self.timer = live_timer
+
+    def process(self, img: np.ndarray) -> List[FaceResult]:
+        """Detect once, then identify and classify emotion for every face"""
+        return self.identify(self.detect(img))
+
+    def identify(self, faces: List[DetectedFace], keys: Optional[Sequence[Hashable]] = None) -> List[FaceResult]:
+        """
+        Identify and classify emotion for already detected faces, each model
+        running a single batched forward pass over the shared crops
+
+        Args:
+            keys: Track id per face, so each face's emotion is smoothed over
+                  its own history (None: only the largest face is smoothed)
+        """
+        if not faces:
+            return []
+        identities, probs = self.score(faces)
+        if probs is None:
+            emotions = self.emotion_detector.smoother.fallback(len(faces), keys)
+        else:
+            emotions = self.emotion_detector.smooth(probs, keys)
+        return [
+            FaceResult(face.box, name, confidence, emotion)
+            for face, (name, confidence), emotion in zip(faces, identities, emotions)
+        ]
+
+    def forget(self, keys: Sequence[Hashable]):
+        """Drop the emotion history of keys that will not be seen again (e.g. dropped tracks)"""
+        self.emotion_detector.smoother.forget(keys)
+
+    def enroll_batch(self, items: List[Tuple[str, np.ndarray]], **kwargs) -> List:
+        """Enroll (user_id, BGR image) pairs into the recognizer's gallery (see FaceRecognizer.enroll_batch)"""
+        return self.recognizer.enroll_batch(items, **kwargs)
+
+    def score(self, faces: List[DetectedFace]) -> Tuple[List[Tuple[Optional[str], float]], Optional[np.ndarray]]:
+        """
+        Stateless half of identify(): (name, confidence) per face and the raw
+        (N, 7) emotion probabilities, or None if emotion classification failed
+        """
+        crops = [face.crop for face in faces]
+        try:
+            with self.timer.time('embed'):
+                embeddings = self.recognizer.embed_batch(crops)
+            with self.timer.time('match'):
+                identities = self.recognizer.identify_batch(embeddings)
+        except Exception as e:
+            print(f"[FACE] Error: {str(e)}")
+            identities = [(None, 0.0)] * len(crops)
+        try:
+            with self.timer.time('emotion'):
+                probs = self.emotion_detector.classify(crops)
+        except Exception as e:
+            print(f"[EMOTION] Error: {str(e)}")
+            probs = None
+        return identities, probs
@@ -1,18 +1,56 @@
 import os
 import cv2
 import json
-import tempfile
+import hashlib
+import threading
 import numpy as np
-from typing import Optional, Tuple, Set
-from deepface import DeepFace
+from typing import List, NamedTuple, Optional, Tuple, Set
+from modules.face_gallery import (FaceGallery, append_representations, l2_normalize,
+                                  make_representation, gallery_file)
+from modules.face_pipeline import to_bgr_crop
+
+
+class EnrollResult(NamedTuple):
+    accepted: bool
+    reason: str            # why the image was rejected ('' when accepted)
+    path: Optional[str]    # stored image when accepted
+
+
+def _letterbox(img: np.ndarray, out: np.ndarray):
+    """Resize into out (rows, cols, 3) keeping aspect ratio and zero padding, scaled to [0, 1]"""
+    rows, cols = out.shape[:2]
+    factor = min(rows / img.shape[0], cols / img.shape[1])
+    resized = cv2.resize(img, (max(1, int(img.shape[1] * factor)), max(1, int(img.shape[0] * factor))))
+    top = (rows - resized.shape[0]) // 2
+    left = (cols - resized.shape[1]) // 2
+    out[:] = 0
+    out[top:top + resized.shape[0], left:left + resized.shape[1]] = resized / 255.0
+
 
 class FaceRecognizer:
-    def __init__(self, db_path: str = "data/faces", auth_file: str = "authorized.json", threshold: float = 0.6):
+    def __init__(self, db_path: str = "data/faces", auth_file: str = "authorized.json", threshold: float = 0.6,
+                 model_name: str = "Facenet", detector_backend: str = "retinaface",
+                 aggregate: Optional[str] = None, index: str = "auto"):
+        """
+        Args:
+            threshold: Maximum cosine distance for a match
+            aggregate: None to match the single closest image, or 'mean'/'max'
+                       to score each identity over all of its images
+            index: Gallery search index: 'brute' (exact), 'ivf' (approximate)
+                   or 'auto' (IVF for large galleries)
+        """
         os.makedirs(db_path, exist_ok=True)
         self.db_path = db_path
         self.threshold = threshold
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.aggregate = aggregate
         self.authorized = self._load_authorized(auth_file)
         self.recognized = set()
+        self._model = None
+        # Embeddings are loaded once and matched in memory
+        self.gallery = FaceGallery.load(db_path, model_name, detector_backend, index)
+        self._enroll_lock = threading.Lock()
 
     def _load_authorized(self, auth_file: str) -> Set[str]:
         if os.path.exists(auth_file):
@@ -20,39 +58,167 @@ class FaceRecognizer:
                 return set(json.load(f))
         return set()
 
-    def register_face(self, img: np.ndarray, user_id: str):
-        user_dir = os.path.join(self.db_path, user_id)
-        os.makedirs(user_dir, exist_ok=True)
-        count = len(os.listdir(user_dir))
-        cv2.imwrite(f"{user_dir}/{count+1}.jpg", img)
+    def register_face(self, img: np.ndarray, user_id: str) -> EnrollResult:
+        """Enroll one BGR image for user_id (see enroll_batch)"""
+        return self.enroll_batch([(user_id, img)])[0]
 
-    def recognize_face(self, img: np.ndarray) -> Tuple[Optional[str], float]:
-        try:
-            if len(img.shape) == 3 and img.shape[2] == 3:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                img_rgb = img
-
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=True) as tmp:
-                cv2.imwrite(tmp.name, img_rgb)
-                results = DeepFace.find(
-                    img_path=tmp.name,
-                    db_path=self.db_path,
-                    model_name="Facenet",
-                    distance_metric="cosine",
-                    enforce_detection=False,
-                    detector_backend="retinaface",
-                    align=True,
-                    silent=True
+    def enroll_batch(self, items: List[Tuple[str, np.ndarray]], min_confidence: float = 0.9,
+                     min_face_size: int = 40, min_sharpness: float = 30.0,
+                     duplicate_similarity: float = 0.97) -> List[EnrollResult]:
+        """
+        Enroll (user_id, BGR image) pairs while recognition keeps running.
+        Every accepted image is embedded once, stored under db_path/<user>/,
+        journaled next to the gallery file and swapped into the
+        in-memory gallery in one step, so enrolling N images costs O(N).
+
+        Args:
+            min_confidence: Lowest detector confidence accepted
+            min_face_size: Smallest face side (px) accepted
+            min_sharpness: Lowest variance of the Laplacian of the face crop (blur check)
+            duplicate_similarity: Cosine similarity to an enrolled or earlier
+                                  image above which an image is a duplicate
+        """
+        with self._enroll_lock:
+            results: List[Optional[EnrollResult]] = [None] * len(items)
+            candidates = []  # (item index, aligned crop, facial area)
+            for i, (_, img) in enumerate(items):
+                reason, crop, area = self._check_quality(img, min_confidence, min_face_size, min_sharpness)
+                if reason:
+                    results[i] = EnrollResult(False, reason, None)
+                else:
+                    candidates.append((i, crop, area))
+
+            accepted = []  # (item index, raw embedding, normalized embedding, facial area)
+            if candidates:
+                embeddings = self.embed_batch([crop for _, crop, _ in candidates])
+                normalized = l2_normalize(embeddings)
+                best = np.full(len(candidates), -1.0, dtype=np.float32)
+                if len(self.gallery):
+                    best = self.gallery.index.search(normalized, 1)[0][:, 0]
+                for (i, _, area), embedding, unit, similarity in zip(candidates, embeddings, normalized, best):
+                    if similarity >= duplicate_similarity:
+                        results[i] = EnrollResult(False, "duplicate of an enrolled image", None)
+                    elif any(float(unit @ other) >= duplicate_similarity for _, _, other, _ in accepted):
+                        results[i] = EnrollResult(False, "duplicate within the batch", None)
+                    else:
+                        accepted.append((i, embedding, unit, area))
+
+            records, labels = [], []
+            for i, embedding, _, area in accepted:
+                user_id, img = items[i]
+                try:
+                    path = self._store_image(user_id, img)
+                except (OSError, ValueError) as e:
+                    results[i] = EnrollResult(False, f"could not store image: {str(e)}", None)
+                    continue
+                records.append(make_representation(path, embedding, area))
+                labels.append(user_id)
+                results[i] = EnrollResult(True, '', path)
+
+            if records:
+                append_representations(gallery_file(self.db_path, self.model_name, self.detector_backend),
+                                       records)
+                # Readers holding the old gallery finish with it; new lookups see the new rows
+                self.gallery = self.gallery.extend(
+                    np.array([r['embedding'] for r in records], dtype=np.float32),
+                    labels,
+                    [r['identity'] for r in records]
                 )
+            print(f"[FACE] Enrolled {len(records)} of {len(items)} images")
+            return results
 
-                if results and isinstance(results, list) and len(results[0]) > 0:
-                    best = results[0].iloc[0]
-                    if best['distance'] < self.threshold:
-                        user_id = os.path.basename(os.path.dirname(best['identity']))
-                        if not self.authorized or user_id in self.authorized:
-                            return user_id, 1 - best['distance']
+    def _check_quality(self, img: np.ndarray, min_confidence: float, min_face_size: int,
+                       min_sharpness: float) -> Tuple[str, Optional[np.ndarray], Optional[dict]]:
+        """(rejection reason or '', aligned BGR crop, facial area) for an enrollment image"""
+        from deepface import DeepFace
+        if img is None or img.size == 0:
+            return "empty image", None, None
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        try:
+            objs = DeepFace.extract_faces(
+                img_path=img,
+                detector_backend=self.detector_backend,
+                enforce_detection=False,
+                align=True
+            )
         except Exception as e:
-            if "Face could not be detected" not in str(e):
-                print(f"[FACE] Error: {str(e)}")
-        return None, 0.0
\ No newline at end of file
+            return f"detection failed: {str(e)}", None, None
+
+        objs = [obj for obj in objs if obj.get('confidence')]
+        if not objs:
+            return "no face detected", None, None
+        if len(objs) > 1:
+            return "more than one face", None, None
+        obj = objs[0]
+        area = obj['facial_area']
+        if obj['confidence'] < min_confidence:
+            return f"low detection confidence ({obj['confidence']:.2f})", None, None
+        if min(area['w'], area['h']) < min_face_size:
+            return f"face too small ({area['w']}x{area['h']})", None, None
+
+        crop = to_bgr_crop(obj['face'])
+        sharpness = cv2.Laplacian(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+        if sharpness < min_sharpness:
+            return f"too blurry (sharpness {sharpness:.1f})", None, None
+        return '', crop, area
+
+    def _store_image(self, user_id: str, img: np.ndarray) -> str:
+        """Write img under db_path/<user>/, named by content hash so concurrent enrollments never collide"""
+        user_dir = os.path.join(self.db_path, user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        ok, buf = cv2.imencode(".jpg", img)
+        if not ok:
+            raise ValueError(f"Could not encode image for {user_id}")
+        path = os.path.join(user_dir, f"{hashlib.sha1(buf.tobytes()).hexdigest()[:16]}.jpg")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buf.tobytes())
+        os.replace(tmp_path, path)
+        return path
+
+    def embed_batch(self, faces: List[np.ndarray]) -> np.ndarray:
+        """Embed aligned BGR face crops in a single forward pass, one row per face"""
+        if not faces:
+            return np.empty((0, self.gallery.dim), dtype=np.float32)
+        model = self._get_model()
+
+        # Same preprocessing DeepFace.represent applies: letterbox to the model input, BGR in [0, 1]
+        cols, rows = model.input_shape
+        batch = np.empty((len(faces), rows, cols, 3), dtype=np.float32)
+        for i, face in enumerate(faces):
+            _letterbox(face, batch[i])
+        return np.asarray(model.model(batch, training=False), dtype=np.float32)
+
+    def _get_model(self):
+        if self._model is None:
+            # TensorFlow is only imported once a model is actually needed
+            from deepface import DeepFace
+            self._model = DeepFace.build_model(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        """Build the embedding model and run one dummy batch so the first real face skips graph construction"""
+        cols, rows = self._get_model().input_shape
+        self.embed_batch([np.zeros((rows, cols, 3), dtype=np.uint8)])
+
+    def identify(self, embedding: np.ndarray) -> Tuple[Optional[str], float]:
+        """Match an embedding against the gallery, applying threshold and authorization"""
+        matches = self.gallery.match(embedding, top_k=1, aggregate=self.aggregate)
+        if matches:
+            user_id, similarity = matches[0]
+            if 1 - similarity < self.threshold:
+                if not self.authorized or user_id in self.authorized:
+                    return user_id, similarity
+        return None, 0.0
+
+    def identify_batch(self, embeddings: np.ndarray) -> List[Tuple[Optional[str], float]]:
+        """identify() for every row of an embedding matrix with one gallery product"""
+        results = []
+        for user_id, similarity in self.gallery.match_batch(embeddings, aggregate=self.aggregate):
+            if (user_id is not None and 1 - similarity < self.threshold
+                    and (not self.authorized or user_id in self.authorized)):
+                results.append((user_id, similarity))
+            else:
+                results.append((None, 0.0))
+        return results
@@ -0,0 +1,210 @@
+import cv2
+import time
+import threading
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+from modules.face_pipeline import DetectedFace, FaceResult
+
+
+def iou(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ix = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _make_cv_tracker():
+    """
+    KCF (or MOSSE) tracker when opencv-contrib is available, else None and
+    the box moves at its last observed velocity until the next detection.
+    Core OpenCV's MIL/CSRT trackers cost ~100 ms per face per frame, far
+    more than the inference they would save, so they are never used.
+    """
+    for name in ('TrackerKCF_create', 'TrackerMOSSE_create'):
+        for module in (cv2, getattr(cv2, 'legacy', None)):
+            if module is not None and hasattr(module, name):
+                return getattr(module, name)()
+    return None
+
+
+class Track:
+    def __init__(self, track_id: int, box: Tuple[int, int, int, int]):
+        self.id = track_id
+        self.box = box
+        self.name: Optional[str] = None
+        self.confidence = 0.0
+        self.emotion = 'neutral'
+        self.misses = 0
+        self.last_identified = -np.inf
+        self.cv_tracker = None
+        self.detected = box           # box of the last matched detection
+        self.velocity = (0.0, 0.0)    # px per update() frame, from consecutive detections
+        self.frames = 0               # update() frames since the last detection
+
+    def result(self) -> FaceResult:
+        return FaceResult(tuple(int(v) for v in self.box), self.name, self.confidence, self.emotion)
+
+
+class FaceTracker:
+    """
+    Carries identity and emotion across frames so the embedding step only
+    runs for new tracks, tracks whose confidence has decayed, or a periodic
+    re-verification. Detections are associated to tracks by IoU; between
+    detections each track follows its face with an OpenCV tracker, or
+    extrapolates at its last velocity where no cheap one is available.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 2,
+                 confidence_decay: float = 0.998, min_confidence: float = 0.5,
+                 reverify_interval: float = 10.0, retry_interval: float = 1.0,
+                 use_cv_tracker: bool = True, reinit_iou: float = 0.5,
+                 on_drop: Optional[Callable[[List[int]], None]] = None):
+        """
+        Args:
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_misses: Detection ticks a track may go unmatched before it is dropped
+            confidence_decay: Per-frame multiplier on identity confidence between verifications
+            min_confidence: Re-identify a named track once its confidence decays below this
+            reverify_interval: Seconds after which a named track is re-verified anyway
+            retry_interval: Seconds between identification attempts for unknown tracks
+            use_cv_tracker: Follow faces between detections with an OpenCV tracker
+            reinit_iou: Restart a track's OpenCV tracker only once it has drifted below
+                        this IoU from the matched detection
+            on_drop: Called with the ids of dropped tracks (e.g. to free their emotion history)
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.confidence_decay = confidence_decay
+        self.min_confidence = min_confidence
+        self.reverify_interval = reverify_interval
+        self.retry_interval = retry_interval
+        self.use_cv_tracker = use_cv_tracker
+        self.reinit_iou = reinit_iou
+        self.on_drop = on_drop
+        self.tracks: List[Track] = []
+        self._next_id = 0
+        # update() runs on the display thread, associate()/assign() on the inference worker;
+        # OpenCV trackers run outside the lock so neither waits on the other's image work
+        self._lock = threading.Lock()
+
+    def update(self, frame: np.ndarray) -> List[FaceResult]:
+        """Advance every track by one frame and return the current results"""
+        with self._lock:
+            followed = [(track, track.cv_tracker) for track in self.tracks if track.cv_tracker is not None]
+        moved = [(track, cv_tracker, cv_tracker.update(frame)) for track, cv_tracker in followed]
+        with self._lock:
+            for track, cv_tracker, (ok, box) in moved:
+                # Skip trackers associate() replaced meanwhile
+                if track.cv_tracker is not cv_tracker:
+                    continue
+                if ok:
+                    track.box = tuple(box)
+                else:
+                    track.cv_tracker = None
+            for track in self.tracks:
+                track.confidence *= self.confidence_decay
+                track.frames += 1
+                if track.cv_tracker is None and track.velocity != (0.0, 0.0):
+                    x, y, w, h = track.box
+                    track.box = (x + track.velocity[0], y + track.velocity[1], w, h)
+            return [track.result() for track in self.tracks]
+
+    def associate(self, faces: List[DetectedFace], frame: np.ndarray) -> List[Tuple[int, DetectedFace]]:
+        """
+        Match fresh detections to tracks, start tracks for new faces and drop
+        stale ones. Returns (track id, face) pairs that need identification.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Greedy IoU matching, best pairs first
+            pairs = sorted(
+                ((iou(track.box, face.box), t, f)
+                 for t, track in enumerate(self.tracks) for f, face in enumerate(faces)),
+                reverse=True
+            )
+            matched_tracks, matched_faces = {}, set()
+            for score, t, f in pairs:
+                if score < self.iou_threshold:
+                    break
+                if t in matched_tracks or f in matched_faces:
+                    continue
+                matched_tracks[t] = f
+                matched_faces.add(f)
+
+            tracks, updated, dropped = [], [], []
+            for t, track in enumerate(self.tracks):
+                if t in matched_tracks:
+                    track.misses = 0
+                    tracks.append(track)
+                    updated.append((track, faces[matched_tracks[t]]))
+                else:
+                    track.misses += 1
+                    if track.misses <= self.max_misses:
+                        tracks.append(track)
+                    else:
+                        dropped.append(track.id)
+            for f, face in enumerate(faces):
+                if f not in matched_faces:
+                    track = Track(self._next_id, face.box)
+                    self._next_id += 1
+                    tracks.append(track)
+                    updated.append((track, face))
+            self.tracks = tracks
+
+            pending, restart = [], []
+            for track, face in updated:
+                if self._snap(track, face):
+                    restart.append((track, face.box))
+                if self._needs_identification(track, now):
+                    pending.append((track.id, face))
+        if restart:
+            self._restart_cv_trackers(restart, frame)
+        if dropped and self.on_drop is not None:
+            self.on_drop(dropped)
+        return pending
+
+    def assign(self, track_id: int, name: Optional[str], confidence: float, emotion: str):
+        """Store the identification result for a track"""
+        with self._lock:
+            for track in self.tracks:
+                if track.id == track_id:
+                    track.name = name
+                    track.confidence = confidence
+                    track.emotion = emotion
+                    track.last_identified = time.monotonic()
+                    break
+
+    def _needs_identification(self, track: Track, now: float) -> bool:
+        elapsed = now - track.last_identified
+        if track.name is None:
+            return elapsed >= self.retry_interval
+        return track.confidence < self.min_confidence or elapsed >= self.reverify_interval
+
+    def _snap(self, track: Track, face: DetectedFace) -> bool:
+        """
+        Move a track onto its detection and update its velocity (caller holds
+        _lock); True if its OpenCV tracker is missing or has drifted off the face
+        """
+        if track.frames:
+            vx = (face.box[0] - track.detected[0]) / track.frames
+            vy = (face.box[1] - track.detected[1]) / track.frames
+            track.velocity = (0.5 * (track.velocity[0] + vx), 0.5 * (track.velocity[1] + vy))
+        drifted = iou(track.box, face.box) < self.reinit_iou
+        track.box = track.detected = face.box
+        track.frames = 0
+        return self.use_cv_tracker and (track.cv_tracker is None or drifted)
+
+    def _restart_cv_trackers(self, restart: List[Tuple[Track, Tuple[int, int, int, int]]], frame: np.ndarray):
+        """(Re)start OpenCV trackers on their detections, outside the lock"""
+        started = []
+        for track, box in restart:
+            cv_tracker = _make_cv_tracker()
+            if cv_tracker is None:
+                return
+            cv_tracker.init(frame, tuple(int(v) for v in box))
+            started.append((track, cv_tracker))
+        with self._lock:
+            for track, cv_tracker in started:
+                track.cv_tracker = cv_tracker
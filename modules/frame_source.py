@@ -0,0 +1,188 @@
+import os
+import cv2
+import time
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple, Union
+
+
+class CaptureThread:
+    """
+    Reads a cv2.VideoCapture on its own thread into a small preallocated
+    ring of frames. Consumers always get the newest frame, so a slow display
+    or inference step drops stale frames instead of letting them queue up.
+    """
+
+    def __init__(self, source: Union[int, str] = 0, ring_size: int = 3, realtime: bool = False):
+        """
+        Args:
+            source: Device index, video file path or stream URL
+            ring_size: Frame slots (>= 3 so capture never waits on the reader)
+            realtime: Pace reads at the source's frame rate, so a video file
+                      stands in for a live camera instead of decoding flat out
+        """
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open camera {source}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if realtime else 0.0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        # Keep the driver from queueing stale frames of its own
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.ring_size = max(3, ring_size)
+        self._ring = None          # allocated on the first frame, then reused
+        self._out = None           # consumer-side buffer, reused across read() calls
+        self._latest = -1          # ring slot holding the newest frame
+        self._reading = -1         # ring slot currently being copied by read()
+        self._seq = 0              # sequence number of the newest frame
+        self._read_seq = 0         # sequence number last handed to the consumer
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.ended = False
+        self.last_timestamp = 0.0  # time.monotonic() when the frame returned by read() was captured
+        self._timestamps = [0.0] * self.ring_size
+
+        # Counters
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_read = 0
+
+    def start(self) -> "CaptureThread":
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        slot = 0
+        next_due = time.monotonic()
+        while self._running:
+            if self.frame_interval:
+                next_due += self.frame_interval
+                time.sleep(max(0.0, next_due - time.monotonic()))
+            if self._ring is None:
+                ret, frame = self.cap.read()
+                if ret:
+                    self._ring = np.empty((self.ring_size,) + frame.shape, dtype=frame.dtype)
+                    self._ring[slot] = frame
+            else:
+                ret, frame = self.cap.read(self._ring[slot])
+                if ret and frame.ctypes.data != self._ring[slot].ctypes.data:
+                    # OpenCV reallocated instead of decoding in place
+                    self._ring[slot] = frame
+
+            if not ret:
+                with self._cond:
+                    self.ended = True
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                if self._seq > self._read_seq:
+                    self.frames_dropped += 1
+                self._timestamps[slot] = time.monotonic()
+                self._latest = slot
+                self._seq += 1
+                self.frames_captured += 1
+                self._cond.notify_all()
+                # Next slot: neither the newest frame nor the one being copied
+                slot = next(i for i in range(self.ring_size) if i != self._latest and i != self._reading)
+
+    def read(self, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray]]:
+        """Wait for a frame newer than the last one returned; (False, None) once the source ends"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or self.ended, timeout):
+                return False, None
+            if self._seq == self._read_seq:
+                return False, None
+            slot = self._reading = self._latest
+            self._read_seq = self._seq
+            self.last_timestamp = self._timestamps[slot]
+
+        # Copy outside the lock; capture skips the slot while it is being read
+        if self._out is None:
+            self._out = np.empty_like(self._ring[slot])
+        np.copyto(self._out, self._ring[slot])
+        with self._cond:
+            self._reading = -1
+        self.frames_read += 1
+        return True, self._out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'captured': self.frames_captured,
+            'read': self.frames_read,
+            'dropped': self.frames_dropped
+        }
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.cap.release()
+
+
+class VideoFileSource:
+    """Every frame of a video file in order, none dropped (offline processing)"""
+
+    def __init__(self, path: str):
+        self.source = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video {path}")
+        self.ended = False
+        self.frames_read = 0
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.cap.read()
+        if not ret:
+            self.ended = True
+            return False, None
+        self.frames_read += 1
+        return True, frame
+
+    def stats(self) -> Dict[str, int]:
+        return {'read': self.frames_read}
+
+    def stop(self):
+        self.cap.release()
+
+
+class ImageDirSource:
+    """Images under a directory (recursively, sorted by path) as a frame sequence"""
+
+    def __init__(self, path: str, extensions: Tuple[str, ...] = ('.jpg', '.jpeg', '.png', '.bmp')):
+        self.source = path
+        self.paths = sorted(
+            os.path.join(root, f)
+            for root, _, files in os.walk(path)
+            for f in files if f.lower().endswith(extensions)
+        )
+        if not self.paths:
+            raise RuntimeError(f"No images found in {path}")
+        self._next = 0
+        self.ended = False
+        self.frames_read = 0
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        while self._next < len(self.paths):
+            frame = cv2.imread(self.paths[self._next])
+            self._next += 1
+            if frame is not None:
+                self.frames_read += 1
+                return True, frame
+        self.ended = True
+        return False, None
+
+    def stats(self) -> Dict[str, int]:
+        return {'read': self.frames_read, 'images': len(self.paths)}
+
+    def stop(self):
+        pass
+
+
+def open_offline_source(path: str):
+    """ImageDirSource for a directory, VideoFileSource otherwise"""
+    return ImageDirSource(path) if os.path.isdir(path) else VideoFileSource(path)
@@ -1,22 +1,61 @@
 import cv2
-import mediapipe as mp
-import math
+import time
 import numpy as np
 import platform
-from typing import Optional
+from typing import Optional, Sequence, Tuple
+
+# MediaPipe hand landmark indices
+WRIST = 0
+THUMB_TIP = 4
+INDEX_TIP = 8
+# Wrist and fingertips: their box bounds the hand closely enough for the next search window
+HAND_EXTENT = (WRIST, THUMB_TIP, INDEX_TIP, 12, 16, 20)
+
+
+def _pixels(landmarks, region, indices) -> np.ndarray:
+    """(len(indices), 2) int frame pixels of the given landmarks, which are normalized to region"""
+    x0, y0, x1, y1 = region
+    normalized = np.array([(landmarks[i].x, landmarks[i].y) for i in indices], dtype=np.float32)
+    return (normalized * (x1 - x0, y1 - y0) + (x0, y0)).astype(np.int32)
+
 
 class GestureController:
-    def __init__(self):
-        # MediaPipe setup
+    def __init__(self, process_width: int = 320, roi_margin: float = 0.5, process_every: int = 1,
+                 hysteresis: float = 2.0, min_interval: float = 0.1):
+        """
+        Args:
+            process_width: Longest side hand tracking runs at (frames are downscaled to it)
+            roi_margin: Search window around the last hand, as a fraction of its size
+            process_every: Track hands every N frames, reusing the last landmarks in between
+            hysteresis: Volume change (percentage points) needed before the level moves
+            min_interval: Minimum seconds between system volume updates
+        """
+        # MediaPipe setup (imported here so attendance-only sessions never load it)
+        import mediapipe as mp
         self.mp_hands = mp.solutions.hands
         self.hands = self.mp_hands.Hands(
             model_complexity=0,
+            max_num_hands=1,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
+        # (K, 2) landmark index pairs for drawing the skeleton
+        self.connections = np.array(sorted(self.mp_hands.HAND_CONNECTIONS), dtype=np.intp)
+        
+        # Tracking state
+        self.process_width = process_width
+        self.roi_margin = roi_margin
+        self.process_every = max(1, process_every)
+        self.roi = None  # (x0, y0, x1, y1) of the last hand, None for a full-frame search
+        self.hand = None  # (landmarks, searched region) from the last tracked frame
+        self.frame_index = 0
         
         # Volume control setup
         self.volume_control = self._init_volume_control()
+        self.hysteresis = hysteresis
+        self.min_interval = min_interval
+        self.applied_vol = None
+        self.applied_at = 0.0
         
         # Volume UI state
         self.vol_bar = 400
@@ -63,51 +102,94 @@ class GestureController:
                           [self.volume_control['min_vol'], self.volume_control['max_vol']])
             self.volume_control['volume'].SetMasterVolumeLevel(vol, None)
 
-    def process_frame(self, frame):
-        """Process hand gestures and return frame with visual feedback"""
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(rgb_frame)
-        
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                # Draw hand landmarks
-                mp.solutions.drawing_utils.draw_landmarks(
-                    frame,
-                    hand_landmarks,
-                    self.mp_hands.HAND_CONNECTIONS,
-                    mp.solutions.drawing_styles.get_default_hand_landmarks_style(),
-                    mp.solutions.drawing_styles.get_default_hand_connections_style()
-                )
-                
-                # Get landmark positions
-                landmarks = []
-                for id, lm in enumerate(hand_landmarks.landmark):
-                    h, w = frame.shape[:2]
-                    landmarks.append((id, int(lm.x * w), int(lm.y * h)))
-                
-                if len(landmarks) >= 9:  # Ensure we have thumb and index finger
-                    # Thumb (4) and index (8) positions
-                    x1, y1 = landmarks[4][1], landmarks[4][2]
-                    x2, y2 = landmarks[8][1], landmarks[8][2]
-                    
-                    # Calculate distance and volume percentage
-                    length = math.hypot(x2 - x1, y2 - y1)
-                    self.vol_per = np.interp(length, [50, 220], [0, 100])
-                    self.vol_bar = np.interp(length, [50, 220], [400, 150])
-                    
-                    # Set system volume if available
-                    self.set_volume(self.vol_per)
-                    
-                    # Draw volume control UI
-                    cv2.circle(frame, (x1, y1), 15, (255, 0, 255), cv2.FILLED)
-                    cv2.circle(frame, (x2, y2), 15, (255, 0, 255), cv2.FILLED)
-                    cv2.line(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+    def process_frame(self, frame, mirror: bool = True, draw_hand: bool = True):
+        """
+        Process hand gestures and return frame with visual feedback.
+
+        Args:
+            mirror: Flip the frame first (selfie view); off when the frame is
+                    shared with the attendance overlay, whose boxes are unflipped
+            draw_hand: Draw the hand skeleton (the pinch line and volume bar always are)
+        """
+        if mirror:
+            frame = cv2.flip(frame, 1)
+        self.frame_index += 1
+        if self.frame_index % self.process_every == 0 or self.hand is None:
+            self.hand = self._track(frame)
+        
+        if self.hand is not None:
+            landmarks, region = self.hand
+            if draw_hand:
+                self._draw_hand(frame, _pixels(landmarks, region, range(len(landmarks))))
+            
+            # Control only needs the thumb (4) and index (8) tips
+            (x1, y1), (x2, y2) = _pixels(landmarks, region, (THUMB_TIP, INDEX_TIP)).tolist()
+            
+            # Calculate distance and volume percentage
+            length = float(np.hypot(x2 - x1, y2 - y1))
+            self._update_volume(float(np.interp(length, [50, 220], [0, 100])))
+            
+            # Draw volume control UI
+            cv2.circle(frame, (x1, y1), 15, (255, 0, 255), cv2.FILLED)
+            cv2.circle(frame, (x2, y2), 15, (255, 0, 255), cv2.FILLED)
+            cv2.line(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
         
         # Draw volume bar (works even without volume control)
         self._draw_volume_bar(frame)
         return frame
 
+    def _track(self, frame) -> Optional[Tuple[Sequence, Tuple[int, int, int, int]]]:
+        """
+        MediaPipe landmarks of the first hand, normalized to the searched
+        region, and that region as (x0, y0, x1, y1) frame pixels; None if no
+        hand was found. Searches the last hand's box while tracking holds and
+        the whole frame otherwise, both downscaled to at most process_width.
+        """
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi if self.roi is not None else (0, 0, w, h)
+        region = frame[y0:y1, x0:x1]
+        scale = min(1.0, self.process_width / max(region.shape[:2]))
+        if scale < 1.0:
+            region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        results = self.hands.process(cv2.cvtColor(region, cv2.COLOR_BGR2RGB))
+        
+        if not results.multi_hand_landmarks:
+            # Lost: fall back to a full-frame search next time
+            self.roi = None
+            return None
+        
+        landmarks = results.multi_hand_landmarks[0].landmark
+        region = (x0, y0, x1, y1)
+        
+        # Next search window: the hand's box grown by roi_margin on each side
+        extent = _pixels(landmarks, region, HAND_EXTENT)
+        (bx0, by0), (bx1, by1) = extent.min(axis=0), extent.max(axis=0)
+        pad = self.roi_margin * max(bx1 - bx0, by1 - by0, 1)
+        self.roi = (max(0, int(bx0 - pad)), max(0, int(by0 - pad)),
+                    min(w, int(bx1 + pad)), min(h, int(by1 + pad)))
+        return landmarks, region
+
+    def _draw_hand(self, frame, points: np.ndarray):
+        """Hand skeleton from pixel landmarks: one polyline call for the bones, one for the joints"""
+        cv2.polylines(frame, points[self.connections], False, (255, 255, 255), 2)
+        # A zero-length 8 px segment rasterizes exactly like a filled radius-4 circle
+        cv2.polylines(frame, np.repeat(points[:, None, :], 2, axis=1), False, (0, 0, 255), 8)
+
+    def _update_volume(self, percentage: float):
+        """
+        Move the level only when the pinch moved more than the hysteresis
+        band, and push it to the system at most every min_interval seconds
+        """
+        if abs(percentage - self.vol_per) >= self.hysteresis or percentage in (0, 100):
+            self.vol_per = percentage
+            self.vol_bar = np.interp(percentage, [0, 100], [self.bar_y_bottom, self.bar_y_top])
+        
+        now = time.monotonic()
+        if self.vol_per != self.applied_vol and now - self.applied_at >= self.min_interval:
+            self.set_volume(self.vol_per)
+            self.applied_vol = self.vol_per
+            self.applied_at = now
+
     def _draw_volume_bar(self, frame):
         """Draw the volume level bar on the frame"""
         bar_width = 40
@@ -0,0 +1,410 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import numpy as np
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+from modules.face_pipeline import DetectedFace, FaceResult
+from modules.face_recognition import EnrollResult
+from modules.emotion_detection import EmotionSmoother
+from modules.metrics import StageTimer
+
+
+def _worker_main(index: int, shm_names: List[str], frame_shape: Tuple[int, int, int],
+                 recognizer_kwargs: Dict, tasks, results):
+    """Worker process: load the models once, then serve detect/identify/enroll tasks"""
+    # Heavy imports happen here, once per worker
+    from modules.face_recognition import FaceRecognizer
+    from modules.emotion_detection import EmotionDetector
+    from modules.face_pipeline import FacePipeline
+
+    # Spawned workers share the parent's resource tracker, so attaching does not
+    # take ownership; the parent unlinks the blocks in close()
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    frames = [np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf) for shm in shms]
+    startup = StageTimer()
+    try:
+        with startup.time('load_models'):
+            pipeline = FacePipeline(FaceRecognizer(**recognizer_kwargs), EmotionDetector())
+        # Warm up before reporting ready so no real frame pays for graph construction
+        pipeline.warm_up(frame_shape, startup)
+    except Exception as e:
+        results.send(('failed', index, f"{type(e).__name__}: {str(e)}"))
+        del frames
+        for shm in shms:
+            shm.close()
+        return
+    results.send(('ready', index, startup.totals))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, kind, payload = task
+        pipeline.timer = StageTimer()
+        try:
+            if kind == 'detect':
+                out = pipeline.detect(frames[payload])
+            elif kind == 'identify':
+                out = pipeline.score(payload)
+            elif kind == 'enroll':
+                # Hand back the appended rows so the other workers can add them too
+                n = len(pipeline.recognizer.gallery)
+                items, kwargs = payload
+                enrolled = pipeline.enroll_batch(items, **kwargs)
+                gallery = pipeline.recognizer.gallery
+                out = (index, enrolled, (gallery.embeddings[n:], gallery.labels[n:], gallery.identities[n:]))
+            else:  # 'extend': rows another worker enrolled
+                pipeline.recognizer.gallery = pipeline.recognizer.gallery.extend(*payload)
+                out = None
+        except Exception as e:
+            out = RuntimeError(f"{kind} failed in worker {os.getpid()}: {str(e)}")
+        results.send((seq, out, (pipeline.timer.totals, pipeline.timer.counts)))
+
+    del frames
+    for shm in shms:
+        shm.close()
+
+
+class InferencePool:
+    """
+    Pool of inference worker processes, each with its own copy of the models,
+    so detection/embedding runs on several cores outside the main process's
+    GIL. Frames travel through preallocated shared-memory slots instead of
+    being pickled; only the small aligned crops are pickled.
+
+    Exposes the same detect()/identify() interface as FacePipeline, so it can
+    replace it in AttendanceSystem. Workers return raw emotion probabilities
+    and the per-track smoothing runs here, so a track's history is not split
+    across whichever workers served it. Both calls block the calling thread until
+    their result arrives (or task_timeout passes), so run them from a thread
+    pool with one thread per worker to keep every process busy.
+
+    enroll_batch() enrolls in one worker and then appends the accepted rows
+    to every other worker's gallery; a respawned worker reads them back from
+    the gallery journal.
+
+    Each worker has its own task queue and result pipe, so when a worker
+    process dies (even mid-write) its outstanding tasks fail at once instead
+    of hanging, the other workers are unaffected, and it is respawned.
+    A worker that dies before it is ready is respawned after an exponential
+    backoff; after max_startup_failures such deaths in a row the pool is
+    marked failed (see error) and warm_up() raises.
+    """
+
+    def __init__(self, num_workers: int, frame_shape: Tuple[int, int, int],
+                 recognizer_kwargs: Optional[Dict] = None, timer: Optional[StageTimer] = None,
+                 slots_per_worker: int = 2, task_timeout: float = 60.0, health_interval: float = 1.0,
+                 startup_timeout: float = 300.0, max_startup_failures: int = 3, restart_backoff: float = 1.0):
+        """
+        Args:
+            num_workers: Worker processes to start
+            frame_shape: (height, width, 3) of the uint8 frames passed to detect()
+            recognizer_kwargs: FaceRecognizer arguments used in every worker
+            timer: Receives the workers' stage timings
+            slots_per_worker: Shared-memory frame slots per worker
+            task_timeout: Seconds detect()/identify() wait for a result before giving up
+            health_interval: Seconds between checks that every worker is still alive
+            startup_timeout: Default seconds warm_up() waits for every worker
+            max_startup_failures: Consecutive deaths before ready after which a worker
+                                  is not respawned and the pool fails
+            restart_backoff: Delay (s) before the first respawn; doubles per consecutive failure
+        """
+        self.num_workers = num_workers
+        self.task_timeout = task_timeout
+        self.health_interval = health_interval
+        self.startup_timeout = startup_timeout
+        self.max_startup_failures = max_startup_failures
+        self.restart_backoff = restart_backoff
+        self.recognizer_kwargs = recognizer_kwargs or {}
+        self.frame_shape = tuple(frame_shape)
+        self.timer = timer or StageTimer()
+        self.detector_backend = (recognizer_kwargs or {}).get('detector_backend', 'retinaface')
+        self.smoother = EmotionSmoother()
+
+        num_slots = num_workers * slots_per_worker
+        frame_bytes = int(np.prod(self.frame_shape))
+        self._shms = [shared_memory.SharedMemory(create=True, size=frame_bytes) for _ in range(num_slots)]
+        self._frames = [np.ndarray(self.frame_shape, dtype=np.uint8, buffer=shm.buf) for shm in self._shms]
+        self._free_slots = queue.Queue()
+        for slot in range(num_slots):
+            self._free_slots.put(slot)
+
+        # Spawn so every worker builds its own TensorFlow state
+        self._ctx = mp.get_context("spawn")
+        self._wakeup, self._stop = self._ctx.Pipe(duplex=False)  # close() stops the collector
+        self._seq = itertools.count()
+        self._pending: Dict[int, Tuple[Future, Optional[int], int]] = {}  # seq -> (future, slot, worker)
+        self._lock = threading.Lock()
+        self._ready = set()  # indices of workers that have warmed up
+        self._all_ready = threading.Event()
+        self._startup: List[Dict[str, float]] = []  # per-worker load and warm-up times
+        self._closing = False
+        self.restarts = 0
+        self.error: Optional[Exception] = None  # set once the pool has given up on a worker
+        self._startup_failures = [0] * num_workers  # consecutive deaths before ready, per worker
+        self._down: Dict[int, float] = {}  # dead worker -> monotonic time it may be respawned
+        self._start_errors: Dict[int, str] = {}  # last startup error a worker reported
+        self._tasks: List = [None] * num_workers
+        self._results: List = [None] * num_workers  # read ends of the workers' result pipes
+        self._workers: List = [None] * num_workers
+        for i in range(num_workers):
+            self._start_worker(i)
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, i: int):
+        """(Re)start worker i on a fresh task queue and result pipe (caller holds _lock for a restart)"""
+        self._tasks[i] = self._ctx.Queue()
+        self._results[i], results = self._ctx.Pipe(duplex=False)
+        self._workers[i] = self._ctx.Process(
+            target=_worker_main,
+            args=(i, [shm.name for shm in self._shms], self.frame_shape,
+                  self.recognizer_kwargs, self._tasks[i], results),
+            name=f"inference-{i}",
+            daemon=True
+        )
+        self._workers[i].start()
+        # Only the worker holds the write end, so its death reads as EOF here
+        results.close()
+
+    def _check_workers(self):
+        """Fail the outstanding tasks of dead workers and respawn them, backing off on startup failures"""
+        now = time.monotonic()
+        for i, worker in enumerate(self._workers):
+            with self._lock:
+                if self._closing or self.error is not None:
+                    return
+                if i in self._down:
+                    if now >= self._down[i]:
+                        del self._down[i]
+                        self._start_worker(i)
+                        self.restarts += 1
+                    continue
+                if worker.is_alive():
+                    continue
+                lost = [seq for seq, (_, _, owner) in self._pending.items() if owner == i]
+                entries = [self._pending.pop(seq) for seq in lost]
+                if i in self._ready:
+                    self._startup_failures[i] = 0
+                else:
+                    self._startup_failures[i] += 1
+                self._ready.discard(i)
+                failures = self._startup_failures[i]
+                if failures >= self.max_startup_failures:
+                    reason = self._start_errors.get(i, f"exit code {worker.exitcode}")
+                    self.error = RuntimeError(f"Inference worker {i} failed to start {failures} times in a row "
+                                              f"({reason})")
+                    self._all_ready.set()  # wake warm_up()
+                    entries += list(self._pending.values())
+                    self._pending.clear()
+                else:
+                    delay = self.restart_backoff * 2 ** (failures - 1) if failures else 0.0
+                    self._down[i] = now + delay
+                old_tasks, old_results = self._tasks[i], self._results[i]
+                self._results[i] = None
+            old_tasks.cancel_join_thread()
+            old_tasks.close()
+            if old_results is not None:
+                old_results.close()
+            if self.error is not None:
+                print(f"[POOL] Error: {str(self.error)}; giving up")
+            else:
+                print(f"[POOL] Worker {i} (pid {worker.pid}) died with exit code {worker.exitcode}; "
+                      f"failed {len(entries)} tasks, restarting it in {self._down[i] - now:.1f}s")
+            self.timer.add('worker_restarts')
+            for future, slot, _ in entries:
+                if slot is not None:
+                    self._free_slots.put(slot)
+                future.set_exception(self.error or RuntimeError(f"Inference worker {i} died"))
+
+    def _collect(self):
+        """Resolve futures as results arrive, in whatever order workers finish"""
+        while True:
+            with self._lock:
+                readers = {conn: i for i, conn in enumerate(self._results) if conn is not None}
+            items = []
+            for conn in wait(list(readers) + [self._wakeup], timeout=self.health_interval):
+                if conn is self._wakeup:
+                    return
+                try:
+                    items.append(conn.recv())
+                except (EOFError, OSError):
+                    # The worker exited; stop polling its pipe until it is respawned
+                    with self._lock:
+                        if self._results[readers[conn]] is conn:
+                            self._results[readers[conn]] = None
+                    conn.close()
+            for item in items:
+                self._handle(item)
+            self._check_workers()
+
+    def _handle(self, item: Tuple):
+        """Apply one message from a worker: readiness, a startup failure or a task result"""
+        seq, out, timings = item
+        if seq == 'ready':
+            self._startup.append(timings)
+            with self._lock:
+                self._ready.add(out)
+                if len(self._ready) == self.num_workers:
+                    self._all_ready.set()
+            return
+        if seq == 'failed':
+            # The process exits next; _check_workers counts the failure
+            print(f"[POOL] Worker {out} could not start: {timings}")
+            self._start_errors[out] = timings
+            return
+
+        with self._lock:
+            entry = self._pending.pop(seq, None)
+        if entry is None:
+            # Already failed (its worker was presumed dead)
+            return
+        future, slot, _ = entry
+        if slot is not None:
+            self._free_slots.put(slot)
+        if timings is not None:
+            totals, counts = timings
+            for stage, seconds in totals.items():
+                self.timer.record(stage, seconds)
+            for counter, n in counts.items():
+                self.timer.add(counter, n)
+        if isinstance(out, Exception):
+            future.set_exception(out)
+        else:
+            future.set_result(out)
+
+    def _submit(self, kind: str, payload, slot: Optional[int] = None, worker: Optional[int] = None) -> Future:
+        future = Future()
+        with self._lock:
+            if self.error is not None or len(self._down) == self.num_workers:
+                if slot is not None:
+                    self._free_slots.put(slot)
+                future.set_exception(self.error or RuntimeError("Every inference worker is restarting"))
+                return future
+            if worker is None:
+                # Fewest outstanding tasks, warmed-up workers first (a respawned one is still loading)
+                load = [0] * self.num_workers
+                for _, _, owner in self._pending.values():
+                    load[owner] += 1
+                up = [i for i in range(self.num_workers) if i not in self._down]
+                worker = min(up, key=lambda i: (i not in self._ready, load[i]))
+            seq = next(self._seq)
+            self._pending[seq] = (future, slot, worker)
+            self._tasks[worker].put((seq, kind, payload))
+        return future
+
+    def detect(self, img: np.ndarray) -> List[DetectedFace]:
+        """Detect and align faces in a worker; the frame is copied into a shared-memory slot"""
+        if img.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {img.shape} does not match the pool's {self.frame_shape}")
+        try:
+            slot = self._free_slots.get(timeout=self.task_timeout)
+        except queue.Empty:
+            print(f"[POOL] Error: no free frame slot after {self.task_timeout:.0f}s")
+            return []
+        np.copyto(self._frames[slot], img)
+        try:
+            return self._submit('detect', slot, slot).result(self.task_timeout)
+        except FutureTimeout:
+            # The slot stays reserved until the late result (or the worker's death) frees it
+            print(f"[POOL] Error: detect timed out after {self.task_timeout:.0f}s")
+        except Exception as e:
+            print(f"[POOL] Error: {str(e)}")
+        return []
+
+    def identify(self, faces: List[DetectedFace], keys: Optional[Sequence[Hashable]] = None) -> List[FaceResult]:
+        """Identify and classify emotion for detected faces in a worker, smoothing emotions per key here"""
+        if not faces:
+            return []
+        try:
+            identities, probs = self._submit('identify', faces).result(self.task_timeout)
+        except Exception as e:
+            reason = f"identify timed out after {self.task_timeout:.0f}s" if isinstance(e, FutureTimeout) else str(e)
+            print(f"[POOL] Error: {reason}")
+            identities, probs = [(None, 0.0)] * len(faces), None
+        emotions = self.smoother.fallback(len(faces), keys) if probs is None else self.smoother(probs, keys)
+        return [
+            FaceResult(face.box, name, confidence, emotion)
+            for face, (name, confidence), emotion in zip(faces, identities, emotions)
+        ]
+
+    def forget(self, keys: Sequence[Hashable]):
+        """Drop the emotion history of keys that will not be seen again (smoothing runs here, not in workers)"""
+        self.smoother.forget(keys)
+
+    def enroll_batch(self, items: List[Tuple[str, np.ndarray]], **kwargs) -> List[EnrollResult]:
+        """
+        Enroll (user_id, BGR image) pairs (see FaceRecognizer.enroll_batch).
+        Returns once every live worker matches against the new rows; raises
+        if the enrolling worker fails or times out.
+        """
+        owner, results, rows = self._submit('enroll', (items, kwargs)).result(self.task_timeout)
+        if len(rows[1]):
+            for i, future in [(i, self._submit('extend', rows, worker=i))
+                              for i in range(self.num_workers) if i != owner]:
+                try:
+                    future.result(self.task_timeout)
+                except Exception as e:
+                    # A respawned worker loads the journaled rows itself; a slow one applies them in order
+                    print(f"[POOL] Worker {i} did not confirm the enrolled rows: {str(e) or type(e).__name__}")
+        return results
+
+    def warm_up(self, frame_shape: Optional[Tuple[int, int, int]] = None,
+                timer: Optional[StageTimer] = None, timeout: Optional[float] = None):
+        """
+        Block until every worker has loaded and warmed up its models (they
+        start doing so on construction). Workers warm up in parallel, so
+        timer gets the slowest worker's time per stage. frame_shape is only
+        accepted for FacePipeline compatibility; the pool's own shape is used.
+
+        Raises:
+            RuntimeError: The pool gave up on a worker that kept failing to start
+            TimeoutError: Not every worker was ready after timeout (default startup_timeout) seconds
+        """
+        timeout = self.startup_timeout if timeout is None else timeout
+        ready = self._all_ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        if not ready:
+            raise TimeoutError(f"{self.num_workers - len(self._ready)} of {self.num_workers} inference workers "
+                               f"not ready after {timeout:.0f}s")
+        if timer is not None:
+            for stage in {stage for totals in self._startup for stage in totals}:
+                timer.record(stage, max(totals.get(stage, 0.0) for totals in self._startup))
+
+    @property
+    def ready_workers(self) -> int:
+        return len(self._ready)
+
+    @property
+    def pending(self) -> int:
+        """Tasks submitted and not yet answered"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+        for tasks, worker in zip(self._tasks, self._workers):
+            # A dead worker's queue was already closed
+            if worker.is_alive():
+                tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self._stop.send(None)
+        self._collector.join(timeout=2)
+        for conn in [self._wakeup, self._stop] + [conn for conn in self._results if conn is not None]:
+            conn.close()
+        # Views must go before their buffers can be released
+        self._frames = []
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,234 @@
+import os
+import re
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds (s) of the latency histogram buckets; one more bucket holds the rest (+Inf)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageTimer:
+    """
+    Accumulates wall time per named pipeline stage plus simple counters.
+    Every recorded duration also lands in a fixed-bucket latency histogram
+    and gauges hold the last value set (e.g. queue depths).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        self.histograms: Dict[str, List[int]] = {}
+        self.gauges: Dict[str, float] = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = [0] * (len(LATENCY_BUCKETS) + 1)
+            histogram[bucket] += 1
+
+    def add(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counts[counter] = self.counts.get(counter, 0) + n
+
+    def set(self, gauge: str, value: float):
+        with self._lock:
+            self.gauges[gauge] = value
+
+    def quantile(self, stage: str, q: float) -> float:
+        """Upper bound (s) of the histogram bucket holding the q-quantile (inf past the last bound)"""
+        with self._lock:
+            histogram = list(self.histograms.get(stage, ()))
+        return _bucket_quantile(histogram, q)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: calls, total and mean milliseconds, and histogram p50/p95 bounds"""
+        with self._lock:
+            return {
+                stage: {
+                    'calls': self.calls[stage],
+                    'total_ms': 1000 * total,
+                    'mean_ms': 1000 * total / self.calls[stage],
+                    'p50_ms': 1000 * _bucket_quantile(self.histograms[stage], 0.5),
+                    'p95_ms': 1000 * _bucket_quantile(self.histograms[stage], 0.95)
+                }
+                for stage, total in self.totals.items()
+            }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Consistent copy of every series, for exporters"""
+        with self._lock:
+            return {
+                'totals': dict(self.totals),
+                'calls': dict(self.calls),
+                'counts': dict(self.counts),
+                'histograms': {stage: list(h) for stage, h in self.histograms.items()},
+                'gauges': dict(self.gauges)
+            }
+
+
+def _bucket_quantile(histogram: List[int], q: float) -> float:
+    total = sum(histogram)
+    if total == 0:
+        return 0.0
+    seen = 0
+    for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), histogram):
+        seen += n
+        if seen >= q * total:
+            return bound
+    return float('inf')
+
+
+def prometheus_text(timer: StageTimer, prefix: str = "attendance") -> str:
+    """
+    Prometheus text exposition of a StageTimer: one histogram family over
+    the stages, a counter per counter and a gauge per gauge
+    """
+    snap = timer.snapshot()
+    lines = [f"# HELP {prefix}_stage_seconds Wall time per pipeline stage",
+             f"# TYPE {prefix}_stage_seconds histogram"]
+    for stage in sorted(snap['histograms']):
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), snap['histograms'][stage]):
+            cumulative += n
+            le = "+Inf" if bound == float('inf') else repr(bound)
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {snap["totals"][stage]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {snap["calls"][stage]}')
+    for counter, n in sorted(snap['counts'].items()):
+        name = f"{prefix}_{_metric_name(counter)}_total"
+        lines += [f"# TYPE {name} counter", f"{name} {n}"]
+    for gauge, value in sorted(snap['gauges'].items()):
+        name = f"{prefix}_{_metric_name(gauge)}"
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class MetricsReporter:
+    """
+    Periodic reporting of a StageTimer: a one-line log of the last
+    interval's per-stage means plus counters and gauges, a Prometheus text
+    file rewritten atomically each interval, and/or a local HTTP endpoint
+    that renders the same text on every scrape. Nothing runs between ticks
+    except the HTTP server thread, if enabled.
+    """
+
+    def __init__(self, timer: StageTimer, interval: float = 10.0, log: bool = True,
+                 path: Optional[str] = None, port: Optional[int] = None,
+                 gauges: Optional[Callable[[], Dict[str, float]]] = None, prefix: str = "attendance"):
+        """
+        Args:
+            timer: Metrics to report
+            interval: Seconds between reports (log line and file)
+            log: Print the log line each interval
+            path: Prometheus text file to (re)write, e.g. for node_exporter's textfile collector
+            port: Serve the text on http://127.0.0.1:<port>/metrics
+            gauges: Called at each report and scrape to refresh sampled gauges (queue depths...)
+        """
+        self.timer = timer
+        self.interval = interval
+        self.log = log
+        self.path = path
+        self.prefix = prefix
+        self.gauges = gauges
+        self._last_report = time.monotonic()
+        self._last_totals: Dict[str, float] = {}
+        self._last_calls: Dict[str, int] = {}
+        self._server = None
+        if port is not None:
+            self._serve(port)
+
+    def _sample(self):
+        if self.gauges is not None:
+            try:
+                for gauge, value in self.gauges().items():
+                    self.timer.set(gauge, value)
+            except Exception as e:
+                print(f"[METRICS] Error: {str(e)}")
+
+    def _serve(self, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        reporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                reporter._sample()
+                body = prometheus_text(reporter.timer, reporter.prefix).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[METRICS] Serving http://127.0.0.1:{self._server.server_address[1]}/metrics")
+
+    def tick(self, now: Optional[float] = None):
+        """Call from the main loop; reports once per interval"""
+        now = time.monotonic() if now is None else now
+        if now - self._last_report >= self.interval:
+            self.report(now)
+
+    def report(self, now: Optional[float] = None):
+        self._last_report = time.monotonic() if now is None else now
+        self._sample()
+        if self.log:
+            print(self.log_line())
+        if self.path:
+            self.write(self.path)
+
+    def log_line(self) -> str:
+        """Per-stage mean ms over the calls since the previous line, then counters and gauges"""
+        snap = self.timer.snapshot()
+        stages = []
+        for stage, total in snap['totals'].items():
+            calls = snap['calls'][stage] - self._last_calls.get(stage, 0)
+            if calls:
+                mean_ms = 1000 * (total - self._last_totals.get(stage, 0.0)) / calls
+                stages.append(f"{stage} {mean_ms:.1f}ms x{calls}")
+        self._last_totals, self._last_calls = snap['totals'], snap['calls']
+        counters = [f"{name} {n}" for name, n in sorted(snap['counts'].items())]
+        gauges = [f"{name} {value:g}" for name, value in sorted(snap['gauges'].items())]
+        return "[METRICS] " + " | ".join(", ".join(part) for part in (stages, counters, gauges) if part)
+
+    def write(self, path: str):
+        """Write the Prometheus text atomically (readers never see a partial file)"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(prometheus_text(self.timer, self.prefix))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[METRICS] Could not write {path}: {str(e)}")
+
+    def close(self):
+        """Final report, then stop the HTTP server"""
+        self.report()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
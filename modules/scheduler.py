@@ -0,0 +1,122 @@
+import cv2
+import time
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+
+class InferenceScheduler:
+    """
+    Decides when to submit a frame for inference instead of a fixed every-Nth
+    frame. A frame goes out as soon as the worker is free if the scene has
+    changed since the last submission (mean absolute difference of a tiny
+    grayscale thumbnail). A static scene is only re-checked on an
+    exponentially backed-off refresh, and a CPU budget caps the fraction of
+    wall time the worker is kept busy.
+    """
+
+    def __init__(self, motion_threshold: float = 3.0, thumb_size: Tuple[int, int] = (32, 24),
+                 idle_interval: float = 1.0, max_idle_interval: float = 8.0,
+                 cpu_budget: float = 0.5, workers: int = 1):
+        """
+        Args:
+            motion_threshold: Mean absolute thumbnail difference (0-255) that counts as motion
+            thumb_size: (width, height) of the motion thumbnail
+            idle_interval: First refresh interval (s) once the scene is static
+            max_idle_interval: Longest refresh interval (s) the backoff grows to
+            cpu_budget: Target fraction (0-1] of wall time each worker spends in inference
+            workers: Inference workers sharing the submissions
+        """
+        if not 0 < cpu_budget <= 1:
+            raise ValueError(f"cpu_budget must be in (0, 1], got {cpu_budget}")
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        self.motion_threshold = motion_threshold
+        self.thumb_size = thumb_size
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.cpu_budget = cpu_budget
+        self.workers = workers
+
+        self._last_thumb: Optional[np.ndarray] = None
+        self._last_submit = -np.inf
+        self._last_duration = 0.0
+        self._backoff = idle_interval
+        self.last_motion = 0.0
+
+        # Counters
+        self.submitted = 0
+        self.skipped_static = 0
+        self.skipped_budget = 0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def should_submit(self, frame: np.ndarray, now: Optional[float] = None) -> bool:
+        """Call only while a worker is free; True means submit this frame now"""
+        now = time.monotonic() if now is None else now
+
+        # Keep the workers' duty cycle within the CPU budget: a job of duration d
+        # may start at most every d / budget seconds per worker
+        min_gap = self._last_duration / (self.cpu_budget * self.workers)
+        if now - self._last_submit < min_gap:
+            self.skipped_budget += 1
+            return False
+
+        thumb = self._thumbnail(frame)
+        if self._last_thumb is None:
+            self.last_motion = float('inf')
+        else:
+            self.last_motion = float(np.mean(np.abs(thumb - self._last_thumb)))
+
+        if self.last_motion >= self.motion_threshold:
+            self._backoff = self.idle_interval
+        elif now - self._last_submit >= self._backoff:
+            self._backoff = min(2 * self._backoff, self.max_idle_interval)
+        else:
+            self.skipped_static += 1
+            return False
+
+        self._last_thumb = thumb
+        self._last_submit = now
+        self.submitted += 1
+        return True
+
+    def completed(self, duration: float):
+        """Report how long the last submitted inference took (s)"""
+        self._last_duration = duration
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'skipped_static': self.skipped_static,
+            'skipped_budget': self.skipped_budget,
+            'last_motion': self.last_motion,
+            'backoff_s': self._backoff
+        }
+
+
+class SequenceGate:
+    """
+    Runs one step of concurrent jobs in submission order: the job with
+    sequence number n enters turn(n) only after jobs first..n-1 have left
+    theirs. Every job must pass through turn() exactly once, in order of
+    submission to a FIFO executor, or later jobs wait forever.
+    """
+
+    def __init__(self, first: int = 1):
+        self._next = first
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def turn(self, seq: int):
+        with self._cond:
+            self._cond.wait_for(lambda: self._next == seq)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._next = seq + 1
+                self._cond.notify_all()
@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from typing import Optional
+from typing import Dict, List, Set, Tuple
 
 class UIDisplay:
     def __init__(self):
@@ -15,25 +15,44 @@ class UIDisplay:
             'default': (255, 255, 255)
         }
 
-    def draw_overlay(self, frame: np.ndarray, name: Optional[str], 
-                    emotion: str, new_log: bool = False) -> np.ndarray:
+    def draw_overlay(self, frame: np.ndarray, results: List, 
+                    new_logs: Set[str] = frozenset(),
+                    scale: Tuple[float, float] = (1.0, 1.0)) -> np.ndarray:
+        """
+        Args:
+            results: FaceResult entries (box, name, confidence, emotion)
+            new_logs: Names whose attendance was just recorded
+            scale: (sx, sy) from the boxes' frame to this frame
+        """
         h, w = frame.shape[:2]
+        recognized = [r for r in results if r.name]
         
         # Status bar background
         cv2.rectangle(frame, (0, 0), (w, 70), (50, 50, 50), -1)
         
-        # Draw face bounding box if recognized
-        if name:
+        # Draw a bounding box per tracked face
+        for result in results:
+            x, y, bw, bh = result.box
+            x1, y1 = int(x * scale[0]), int(y * scale[1])
+            x2, y2 = int((x + bw) * scale[0]), int((y + bh) * scale[1])
+            color = self.colors.get(result.emotion.lower(), self.colors['default']) if result.name else self.colors['default']
+            label = f"{result.name} ({result.emotion})" if result.name else "Unknown"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, label, (x1, max(y1 - 8, 85)), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        
+        if recognized:
+            emotion = recognized[0].emotion
             color = self.colors.get(emotion.lower(), self.colors['default'])
-            cv2.rectangle(frame, (0, 70), (w, h), color, 2)
             
             # Display info
-            cv2.putText(frame, f"User: {name}", (10, 25), 
+            names = ", ".join(r.name for r in recognized)
+            cv2.putText(frame, f"User: {names}", (10, 25), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
             cv2.putText(frame, f"Emotion: {emotion}", (10, 50), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
             
-            if new_log:
+            if new_logs:
                 cv2.putText(frame, "RECORDED", (w-120, 45), 
                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 cv2.drawMarker(frame, (w-150, 35), (0, 255, 0), 
@@ -42,4 +61,29 @@ class UIDisplay:
             cv2.putText(frame, "No authorized face detected", (10, 40), 
                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
-        return frame
\ No newline at end of file
+        return frame
+
+    def draw_debug_panel(self, frame: np.ndarray, stages: Dict[str, Dict[str, float]],
+                         values: Dict[str, float] = None, origin: Tuple[int, int] = (10, 90)) -> np.ndarray:
+        """
+        Translucent per-stage latency table (mean and p95 ms) plus counters
+        and gauges, e.g. from StageTimer.summary() and its counts/gauges
+        """
+        lines = [f"{'stage':<10}{'mean':>8}{'p95':>8}"]
+        lines += [f"{stage:<10}{s['mean_ms']:>8.1f}{s['p95_ms']:>8.0f}" for stage, s in stages.items()]
+        lines += [f"{name}: {value:g}" for name, value in sorted((values or {}).items())]
+        
+        x, y = origin
+        line_h = 16
+        h = min(len(lines) * line_h + 8, frame.shape[0] - y)
+        if h <= 0:
+            return frame
+        # Darken only the panel's region
+        panel = frame[y:y + h, x:x + 230]
+        panel[:] = panel // 3
+        for i, line in enumerate(lines):
+            if (i + 1) * line_h > h:
+                break
+            cv2.putText(frame, line, (x + 6, y + (i + 1) * line_h), 
+                       cv2.FONT_HERSHEY_PLAIN, 1, (0, 255, 0), 1)
+        return frame
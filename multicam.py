@@ -0,0 +1,310 @@
+"""
+Attendance over several cameras in one process.
+
+Every source (device index, video file or RTSP URL) gets its own capture
+thread, face tracker and motion scheduler, but all of them share one set of
+models (or one InferencePool), one gallery and one attendance logger, so a
+person seen at two doors is logged once and memory grows with the number
+of streams, not with model copies. A single inference thread serves the
+streams in rotating round-robin order, one frame per stream per round, and
+identifies the faces of the whole round in one batched call.
+
+Usage:
+    python multicam.py 0 1
+    python multicam.py rtsp://door-a/stream rtsp://door-b/stream --workers 2
+    python multicam.py hallway_a.mp4 hallway_b.mp4 --headless --metrics-file multicam.prom
+"""
+import os
+import cv2
+import time
+import argparse
+import threading
+import numpy as np
+from typing import Callable, List, Optional, Sequence, Union
+from concurrent.futures import ThreadPoolExecutor
+from modules.ui_display import UIDisplay
+from modules.face_recognition import FaceRecognizer
+from modules.emotion_detection import EmotionDetector
+from modules.face_pipeline import FacePipeline
+from modules.face_tracker import FaceTracker
+from modules.attendance_logger import AttendanceLogger
+from modules.frame_source import CaptureThread
+from modules.metrics import MetricsReporter, StageTimer
+from modules.scheduler import InferenceScheduler
+from modules.inference_pool import InferencePool
+
+
+class CameraStream:
+    """Per-source state: capture, tracks and the frame waiting for the next inference round"""
+
+    def __init__(self, stream_id: int, source: Union[int, str], infer_size,
+                 forget: Optional[Callable[[List], None]] = None):
+        """
+        Args:
+            forget: Receives the emotion-smoothing keys of dropped tracks
+        """
+        self.id = stream_id
+        self.source = source
+        # Local files stand in for live cameras, so pace them at their frame rate
+        self.capture = CaptureThread(source, realtime=isinstance(source, str) and os.path.isfile(source))
+        self.infer_size = tuple(infer_size)
+        on_drop = None if forget is None else lambda ids: forget([(stream_id, track_id) for track_id in ids])
+        self.tracker = FaceTracker(on_drop=on_drop)
+        # The rounds already bound each stream to one job at a time, so only gate on motion
+        self.scheduler = InferenceScheduler(cpu_budget=1.0)
+        self.tracks = []
+        self.last_logs = set()
+        self.pending: Optional[np.ndarray] = None  # inference-sized frame for the next round
+        self.busy = False
+        self.frames = 0
+        self.inferred = 0
+        self.ended = False
+
+
+class MultiCameraSystem:
+    def __init__(self, sources: Sequence[Union[int, str]], infer_size=(480, 360),
+                 attendance_file="attendance.xlsx", store_path="attendance.db", inference_workers=0,
+                 display=True, metrics_interval=10.0, metrics_file=None, metrics_port=None):
+        self.infer_size = tuple(infer_size)
+        self.display = display
+        self.timer = StageTimer()
+        self.startup = StageTimer()
+
+        # One copy of the models for every stream
+        frame_shape = (self.infer_size[1], self.infer_size[0], 3)
+        with self.startup.time('gallery'):
+            if inference_workers > 0:
+                self.face_pipeline = InferencePool(inference_workers, frame_shape, timer=self.timer)
+            else:
+                self.face_pipeline = FacePipeline(FaceRecognizer(), EmotionDetector(), timer=self.timer)
+        # Detections of one round run concurrently when there are workers to take them
+        self.detect_executor = ThreadPoolExecutor(max_workers=max(1, inference_workers))
+        # One logger: its dedup set is what makes a person count once across doors
+        with self.startup.time('attendance_store'):
+            self.attendance_logger = AttendanceLogger(attendance_file, store_path)
+        self.ui = UIDisplay()
+
+        with self.startup.time('camera_open'):
+            self.streams = []
+            for source in sources:
+                # One unreachable camera should not take the other doors down
+                try:
+                    self.streams.append(CameraStream(len(self.streams), source, self.infer_size,
+                                                     self._forget))
+                except RuntimeError as e:
+                    print(f"[MULTICAM] Skipping {source}: {str(e)}")
+        if not self.streams:
+            raise RuntimeError("None of the sources could be opened")
+        self._cond = threading.Condition()
+        self._running = False
+        self._cursor = 0  # stream served first in the next round
+        self._inference = threading.Thread(target=self._inference_loop, name="multicam-inference", daemon=True)
+        self.metrics = MetricsReporter(self.timer, metrics_interval, path=metrics_file, port=metrics_port,
+                                       gauges=self._sample_gauges)
+
+    def _sample_gauges(self):
+        gauges = {'streams_waiting': sum(s.pending is not None for s in self.streams),
+                  'attendance_queue_depth': self.attendance_logger.stats()['queue_depth']}
+        if isinstance(self.face_pipeline, InferencePool):
+            gauges['pool_pending'] = self.face_pipeline.pending
+        for stream in self.streams:
+            gauges[f'stream{stream.id}_capture_dropped'] = stream.capture.stats()['dropped']
+            gauges[f'stream{stream.id}_inferred'] = stream.inferred
+        return gauges
+
+    def _next_round(self) -> List[CameraStream]:
+        """Wait for work; one frame from every waiting stream, starting at a rotating cursor"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running or any(s.pending is not None for s in self.streams))
+            if not self._running:
+                return []
+            n = len(self.streams)
+            order = [self.streams[(self._cursor + i) % n] for i in range(n)]
+            self._cursor = (self._cursor + 1) % n
+            batch = [s for s in order if s.pending is not None]
+            for stream in batch:
+                stream.busy = True
+            return batch
+
+    def _forget(self, keys: List):
+        # Late-bound: the pipeline is replaced if the worker pool fails to start
+        self.face_pipeline.forget(keys)
+
+    def _warm_up(self):
+        frame_shape = (self.infer_size[1], self.infer_size[0], 3)
+        try:
+            self.face_pipeline.warm_up(frame_shape, self.startup)
+        except Exception as e:
+            if not isinstance(self.face_pipeline, InferencePool):
+                raise
+            print(f"[POOL] Error: {str(e)}; falling back to in-process inference")
+            self.face_pipeline.close()
+            self.face_pipeline = FacePipeline(FaceRecognizer(), EmotionDetector(), timer=self.timer)
+            # One in-process pipeline serves one detection at a time
+            self.detect_executor.shutdown()
+            self.detect_executor = ThreadPoolExecutor(max_workers=1)
+            self.face_pipeline.warm_up(frame_shape, self.startup)
+
+    def _inference_loop(self):
+        self._warm_up()
+        breakdown = ", ".join(f"{stage} {s['total_ms'] / 1000:.2f}s" for stage, s in self.startup.summary().items())
+        print(f"[STARTUP] {len(self.streams)} streams ready ({breakdown})")
+
+        while self._running:
+            streams = self._next_round()
+            if not streams:
+                continue
+            start = time.monotonic()
+            frames = [stream.pending for stream in streams]
+            try:
+                detections = list(self.detect_executor.map(self.face_pipeline.detect, frames))
+
+                # Faces every tracker cannot vouch for, from all streams, in one identify call
+                owners, faces, keys = [], [], []
+                for stream, frame, found in zip(streams, frames, detections):
+                    for track_id, face in stream.tracker.associate(found, frame):
+                        owners.append((stream, track_id))
+                        faces.append(face)
+                        # Emotion history per (stream, track); track ids restart in every stream
+                        keys.append((stream.id, track_id))
+                self.timer.add('batched_faces', len(faces))
+                results = self.face_pipeline.identify(faces, keys)
+
+                new_logs = {stream.id: set() for stream in streams}
+                for (stream, track_id), (_, name, confidence, emotion) in zip(owners, results):
+                    stream.tracker.assign(track_id, name, confidence, emotion)
+                    if name and confidence > 0.6:
+                        with self.timer.time('log'):
+                            logged = self.attendance_logger.log(name, emotion)
+                        if logged:
+                            print(f"[ATTENDANCE] {name} logged at stream {stream.id} ({stream.source})")
+                            new_logs[stream.id].add(name)
+            except Exception as e:
+                print(f"[MULTICAM] Inference error: {str(e)}")
+                new_logs = {stream.id: set() for stream in streams}
+
+            duration = time.monotonic() - start
+            self.timer.record('round', duration)
+            with self._cond:
+                for stream in streams:
+                    stream.last_logs = new_logs[stream.id]
+                    stream.scheduler.completed(duration)
+                    stream.inferred += 1
+                    stream.pending = None
+                    stream.busy = False
+
+    def _poll(self, stream: CameraStream) -> Optional[np.ndarray]:
+        """Advance one stream by its newest frame, if any; returns the annotated inference-sized frame"""
+        ret, frame = stream.capture.read(timeout=0.0)
+        if not ret:
+            stream.ended = stream.capture.ended
+            return None
+        stream.frames += 1
+        self.timer.record('capture', time.monotonic() - stream.capture.last_timestamp)
+        with self.timer.time('resize'):
+            small_frame = cv2.resize(frame, self.infer_size)
+        with self.timer.time('track'):
+            stream.tracks = stream.tracker.update(small_frame)
+
+        with self._cond:
+            if not stream.busy and stream.pending is None and stream.scheduler.should_submit(small_frame):
+                # The capture buffer is reused, the resize output is not
+                stream.pending = small_frame
+                self.timer.add('infer_submitted')
+                self._cond.notify()
+        return small_frame
+
+    def _tile(self, frames: List[Optional[np.ndarray]], mosaic: np.ndarray) -> np.ndarray:
+        """Draw each stream's overlay and place it in a grid cell of the preallocated mosaic"""
+        w, h = self.infer_size
+        cols = mosaic.shape[1] // w
+        for stream, frame in zip(self.streams, frames):
+            if frame is None:
+                continue
+            frame = frame.copy() if frame is stream.pending else frame
+            frame = self.ui.draw_overlay(frame, stream.tracks, stream.last_logs)
+            cv2.putText(frame, f"[{stream.id}] {stream.source}", (10, h - 10),
+                        cv2.FONT_HERSHEY_PLAIN, 1.2, (200, 200, 200), 1)
+            row, col = divmod(stream.id, cols)
+            mosaic[row * h:(row + 1) * h, col * w:(col + 1) * w] = frame
+        return mosaic
+
+    def run(self, max_seconds: Optional[float] = None):
+        for stream in self.streams:
+            stream.capture.start()
+        self._running = True
+        self._inference.start()
+        cols = int(np.ceil(np.sqrt(len(self.streams))))
+        rows = int(np.ceil(len(self.streams) / cols))
+        mosaic = np.zeros((rows * self.infer_size[1], cols * self.infer_size[0], 3), dtype=np.uint8)
+        started = time.monotonic()
+        try:
+            while not all(stream.ended for stream in self.streams):
+                if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                    break
+                frames = [self._poll(stream) for stream in self.streams]
+                if all(frame is None for frame in frames):
+                    time.sleep(0.002)  # Nothing new on any stream
+                elif self.display:
+                    with self.timer.time('render'):
+                        cv2.imshow("Smart Attendance System - Multi Camera", self._tile(frames, mosaic))
+                if self.display and cv2.waitKey(1) == 27:
+                    break
+                self.metrics.tick()
+        finally:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+            self._inference.join(timeout=30)
+            if self._inference.is_alive():
+                # Its late log() calls are refused once the logger is closed
+                print("[MULTICAM] Inference thread still busy after 30s; closing without its last round")
+            for stream in self.streams:
+                stream.capture.stop()
+                print(f"[CAPTURE] Stream {stream.id} ({stream.source}): {stream.capture.stats()}, "
+                      f"inferred {stream.inferred}")
+            self.metrics.close()
+            self.detect_executor.shutdown()
+            if isinstance(self.face_pipeline, InferencePool):
+                self.face_pipeline.close()
+            self.attendance_logger.close()
+            if self.display:
+                cv2.destroyAllWindows()
+
+
+def parse_source(source: str) -> Union[int, str]:
+    """Device indices are given as plain integers"""
+    return int(source) if source.isdigit() else source
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Device indices, video files or stream URLs")
+    parser.add_argument("--infer-size", type=int, nargs=2, default=(480, 360), metavar=("W", "H"))
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Inference worker processes shared by all streams (0: in this process)")
+    parser.add_argument("--attendance-file", default="attendance.xlsx")
+    parser.add_argument("--store", default="attendance.db")
+    parser.add_argument("--headless", action="store_true", help="No window")
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    parser.add_argument("--metrics-file", help="Prometheus text metrics file, rewritten every interval")
+    parser.add_argument("--metrics-port", type=int, help="Serve metrics on http://127.0.0.1:<port>/metrics")
+    args = parser.parse_args()
+
+    system = MultiCameraSystem(
+        [parse_source(s) for s in args.sources],
+        infer_size=args.infer_size,
+        attendance_file=args.attendance_file,
+        store_path=args.store,
+        inference_workers=args.workers,
+        display=not args.headless,
+        metrics_interval=args.metrics_interval,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port
+    )
+    system.run(args.max_seconds)
+
+
+if __name__ == "__main__":
+    main()
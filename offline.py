@@ -0,0 +1,125 @@
+"""
+Headless attendance processing over a video file or an image directory.
+
+Runs the same undistort -> detect -> embed -> emotion -> log pipeline as
+main.py, synchronously and without a camera or display, and reports
+per-stage timings plus frames/sec and faces/sec.
+
+Usage:
+    python offline.py data/faces --detect-interval 1
+    python offline.py hallway.mp4 --infer-size 640 480 --json report.json
+"""
+import os
+import json
+import time
+import argparse
+from main import AttendanceSystem
+from modules.frame_source import open_offline_source
+
+STAGES = ['decode', 'undistort', 'resize', 'track', 'detect', 'embed', 'match', 'emotion', 'log']
+
+
+def run_offline(system: AttendanceSystem, source, max_frames=None) -> dict:
+    """Process every frame of source through system; returns a throughput report"""
+    timer = system.timer
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while max_frames is None or frames < max_frames:
+            with timer.time('decode'):
+                ret, frame = source.read()
+            if not ret:
+                break
+            _, small_frame = system._prepare_frame(frame)
+
+            if system.use_tracker:
+                with timer.time('track'):
+                    system.face_tracker.update(small_frame)
+
+            # Unlike the live loop the first frame is processed too
+            if system._should_infer(small_frame, frames):
+                submitted = time.monotonic()
+                system.submit_seq += 1
+                system._async_process(small_frame, system.submit_seq)
+                if system.scheduler is not None:
+                    system.scheduler.completed(time.monotonic() - submitted)
+            frames += 1
+    finally:
+        source.stop()
+        system.attendance_logger.flush()
+
+    elapsed = time.perf_counter() - start
+    faces = timer.counts.get('faces', 0)
+    return {
+        'source': str(source.source),
+        'frames': frames,
+        'faces': faces,
+        'detect_interval': system.detect_interval,
+        'schedule': 'adaptive' if system.scheduler is not None else 'fixed',
+        'infer_size': list(system.infer_size),
+        'undistort_mode': system.undistort_mode,
+        'tracker': system.use_tracker,
+        'wall_s': elapsed,
+        'fps': frames / elapsed if elapsed else 0.0,
+        'faces_per_s': faces / elapsed if elapsed else 0.0,
+        'stages': timer.summary()
+    }
+
+
+def print_report(report: dict):
+    print(f"source: {report['source']}")
+    print(f"frames: {report['frames']}  faces: {report['faces']}  wall: {report['wall_s']:.2f}s")
+    print(f"throughput: {report['fps']:.2f} frames/s, {report['faces_per_s']:.2f} faces/s")
+    print(f"{'stage':<10} {'calls':>7} {'mean ms':>10} {'p95 ms':>8} {'total ms':>11}")
+    stages = report['stages']
+    for stage in STAGES + sorted(set(stages) - set(STAGES)):
+        if stage in stages:
+            s = stages[stage]
+            print(f"{stage:<10} {s['calls']:>7} {s['mean_ms']:>10.2f} {s['p95_ms']:>8.1f} {s['total_ms']:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--schedule", choices=["fixed", "adaptive"], default="fixed",
+                        help="fixed: every --detect-interval frames; adaptive: on motion, within a CPU budget")
+    parser.add_argument("--detect-interval", type=int, default=20, help="Run inference every N frames")
+    parser.add_argument("--infer-size", type=int, nargs=2, default=(480, 360), metavar=("W", "H"))
+    parser.add_argument("--undistort", choices=["full", "infer", "off"], default="off")
+    parser.add_argument("--tracker", choices=["on", "off", "auto"], default="auto",
+                        help="auto: on for videos, off for image directories (unrelated frames)")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--store", default=":memory:", help="Attendance store (default: in memory)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--metrics-file", help="Also write Prometheus text metrics to this file")
+    args = parser.parse_args()
+
+    use_tracker = args.tracker == "on" or (args.tracker == "auto" and not os.path.isdir(args.source))
+    system = AttendanceSystem(
+        detect_interval=args.detect_interval,
+        infer_size=args.infer_size,
+        undistort_mode=args.undistort,
+        attendance_file="",
+        store_path=args.store,
+        use_tracker=use_tracker,
+        schedule=args.schedule,
+        metrics_file=args.metrics_file
+    )
+    try:
+        # Keep model warm-up out of the throughput numbers
+        system._report_startup()
+        report = run_offline(system, open_offline_source(args.source), args.max_frames)
+        report['startup'] = system.startup.summary()
+    finally:
+        system.attendance_logger.close(export=False)
+
+    print_report(report)
+    if args.metrics_file:
+        system.metrics.write(args.metrics_file)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
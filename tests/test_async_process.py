@@ -0,0 +1,70 @@
+import threading
+import numpy as np
+from main import AttendanceSystem
+from modules.face_pipeline import DetectedFace, FaceResult
+from modules.face_tracker import FaceTracker
+from modules.metrics import StageTimer
+from modules.scheduler import SequenceGate
+
+FRAME = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+class _Pipeline:
+    """Frame n's face sits at x = 10 * n; frame 1's detection is held until frame 2 has finished"""
+
+    def __init__(self):
+        self.release_first = threading.Event()
+
+    def detect(self, frame):
+        n = int(frame[0, 0, 0])
+        if n == 1:
+            self.release_first.wait(5)
+        return [DetectedFace(np.zeros((40, 40, 3), np.uint8), (10 * n, 10, 40, 40), {}, 0.99)]
+
+    def identify(self, faces, keys):
+        return [FaceResult(face.box, f"seen at {face.box[0]}", 0.5, 'neutral') for face in faces]
+
+
+class _Logger:
+    def log(self, name, emotion):
+        return False
+
+
+def _system():
+    system = AttendanceSystem.__new__(AttendanceSystem)
+    system.face_pipeline = _Pipeline()
+    # Every track is (re)identified on every frame
+    system.face_tracker = FaceTracker(use_cv_tracker=False, retry_interval=-1.0, reverify_interval=-1.0)
+    system.use_tracker = True
+    system.timer = StageTimer()
+    system.attendance_logger = _Logger()
+    system.associate_gate = SequenceGate(first=1)
+    system.assign_gate = SequenceGate(first=1)
+    return system
+
+
+def _frame(n):
+    frame = FRAME.copy()
+    frame[0, 0, 0] = n
+    return frame
+
+
+def test_results_apply_in_frame_order_when_workers_finish_out_of_order():
+    system = _system()
+    first = threading.Thread(target=system._async_process, args=(_frame(1), 1))
+    second = threading.Thread(target=system._async_process, args=(_frame(2), 2))
+    first.start()
+    second.start()
+    # Frame 2 is detected and identified, but must not touch the tracker before frame 1
+    second.join(0.3)
+    assert second.is_alive()
+    assert system.face_tracker.tracks == []
+    system.face_tracker.update(FRAME)
+    system.face_pipeline.release_first.set()
+    first.join(5)
+    second.join(5)
+
+    result, = system.face_tracker.update(FRAME)
+    # One track, on the newest frame's box and with the newest frame's label
+    assert result.box == (20, 10, 40, 40)
+    assert result.name == "seen at 20"
@@ -0,0 +1,57 @@
+import pytest
+from modules.attendance_logger import AttendanceLogger
+from modules.attendance_store import open_store
+
+
+@pytest.fixture(params=["log.db", "log.csv"])
+def store_path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def _logger(store_path, **kwargs):
+    # No sheet: nothing to import at start or export at close
+    return AttendanceLogger(file_path="", store_path=store_path, **kwargs)
+
+
+def test_each_name_is_logged_once_per_session(store_path):
+    logger = _logger(store_path)
+    assert logger.log("ann", "happy")
+    assert not logger.log("ann", "sad")
+    assert logger.log("bob", "neutral")
+    assert logger.flush()
+    assert [row[:2] for row in logger.store.read_all()] == [("ann", "happy"), ("bob", "neutral")]
+    assert logger.close(export=False)
+
+
+def test_flush_writes_before_the_interval(store_path):
+    logger = _logger(store_path, flush_interval=60.0)
+    logger.log("ann", "happy")
+    assert logger.flush()
+    assert logger.stats()['records_written'] == 1
+    assert len(logger.store.read_all()) == 1
+    logger.close(export=False)
+
+
+def test_close_drains_the_queue_and_refuses_later_logs(store_path):
+    logger = _logger(store_path, flush_interval=60.0, batch_size=1000)
+    for i in range(50):
+        logger.log(f"p{i}", "neutral")
+    assert logger.close(export=False)
+    assert not logger.log("late", "neutral")
+
+    store = open_store(store_path)
+    assert len(store.read_all()) == 50
+    store.close()
+
+
+def test_failed_writes_are_reported(store_path):
+    logger = _logger(store_path, flush_interval=0.05)
+
+    def broken(records):
+        raise OSError("disk full")
+    logger.store.append = broken
+    logger.log("ann", "happy")
+    assert not logger.flush()
+    assert logger.stats()['write_errors'] >= 1
+    # The batch is still unwritten when the writer stops
+    assert not logger.close(export=False)
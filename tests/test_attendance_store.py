@@ -0,0 +1,44 @@
+import pytest
+from modules.attendance_store import COLUMNS, CsvJournal, SQLiteStore, open_store
+
+RECORDS = [("ann", "happy", "2024-01-01 09:00:00", "s1"), ("bob", "neutral", "2024-01-01 09:00:05", "s1")]
+
+
+@pytest.mark.parametrize("name, backend", [("log.db", SQLiteStore), ("log.csv", CsvJournal)])
+def test_appends_survive_reopening(tmp_path, name, backend):
+    path = str(tmp_path / name)
+    store = open_store(path)
+    assert isinstance(store, backend)
+    store.append(RECORDS[:1])
+    store.append(RECORDS[1:])
+    assert store.read_all() == RECORDS
+    store.close()
+
+    reopened = open_store(path)
+    reopened.append(RECORDS[:1])
+    assert reopened.read_all() == RECORDS + RECORDS[:1]
+    reopened.close()
+
+
+def test_csv_header_is_written_once(tmp_path):
+    path = tmp_path / "log.csv"
+    for _ in range(2):
+        store = open_store(str(path), sync="off")
+        store.append(RECORDS)
+        store.close()
+    lines = path.read_text().splitlines()
+    assert lines.count(",".join(COLUMNS)) == 1 and len(lines) == 5
+
+
+def test_in_memory_sqlite():
+    store = open_store(":memory:")
+    store.append(RECORDS)
+    assert store.read_all() == RECORDS
+    store.close()
+
+
+def test_rejects_unknown_paths_and_sync_policies(tmp_path):
+    with pytest.raises(ValueError):
+        open_store(str(tmp_path / "log.xlsx"))
+    with pytest.raises(ValueError):
+        open_store(str(tmp_path / "log.db"), sync="sometimes")
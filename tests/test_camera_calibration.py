@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from modules.camera_calibration import Undistorter, calibrate_camera
+
+
+def _setup(tmp_path, images=5):
+    """Undecodable stand-in images (never searched while the cache holds) and a pre-fingerprint cache"""
+    image_dir = tmp_path / "calibration"
+    image_dir.mkdir()
+    for i in range(images):
+        (image_dir / f"{i}.jpg").write_bytes(f"image {i}".encode())
+    cache = tmp_path / "camera_params.npz"
+    mtx, dist = np.eye(3) * 500, np.zeros((1, 5))
+    np.savez(cache, camera_matrix=mtx, dist_coeffs=dist)
+    return str(image_dir), str(cache), mtx
+
+
+def test_legacy_cache_gets_the_current_fingerprint_once(tmp_path):
+    image_dir, cache, mtx = _setup(tmp_path)
+    found, _ = calibrate_camera(image_dir, cache_file=cache)
+    assert np.array_equal(found, mtx)
+    with np.load(cache) as data:
+        assert "fingerprint" in data.files
+    # Same images: the migrated cache is used as is
+    assert np.array_equal(calibrate_camera(image_dir, cache_file=cache)[0], mtx)
+
+
+def test_migrated_cache_is_invalidated_by_new_images(tmp_path):
+    image_dir, cache, _ = _setup(tmp_path)
+    calibrate_camera(image_dir, cache_file=cache)
+    (tmp_path / "calibration" / "0.jpg").write_bytes(b"retaken")
+    # Recalibrates, and the stand-in images hold no chessboard
+    with pytest.raises(ValueError, match="at least 5"):
+        calibrate_camera(image_dir, cache_file=cache)
+
+
+def test_migrated_cache_is_invalidated_by_board_size(tmp_path):
+    image_dir, cache, _ = _setup(tmp_path)
+    calibrate_camera(image_dir, cache_file=cache)
+    with pytest.raises(ValueError):
+        calibrate_camera(image_dir, chessboard_size=(7, 5), cache_file=cache)
+
+
+def _undistorter(k1=-0.3):
+    """Barrel distortion on a 320x240 calibration, maps kept in memory"""
+    mtx = np.array([[300.0, 0, 160], [0, 300.0, 120], [0, 0, 1]])
+    return Undistorter(mtx, np.array([[k1, 0, 0, 0, 0]]), calib_size=(320, 240), cache_file=None)
+
+
+def _bright_box(img):
+    ys, xs = np.nonzero(img > 127)
+    return xs.min(), ys.min(), xs.max() - xs.min() + 1, ys.max() - ys.min() + 1
+
+
+def _raw_frame(size, box):
+    raw = np.zeros(size[::-1], dtype=np.uint8)
+    x, y, w, h = box
+    raw[y:y + h, x:x + w] = 255
+    return raw
+
+
+@pytest.mark.parametrize("scale", [1, 2])
+def test_distort_boxes_maps_points_back_to_the_raw_frame(scale):
+    undistorter = _undistorter()
+    size = (320 * scale, 240 * scale)
+    # A small blob near a corner, where distortion is strongest
+    raw_box = np.array([260, 30, 4, 4]) * scale
+    x, y, w, h = _bright_box(undistorter(_raw_frame(size, raw_box)))
+    assert abs(x - raw_box[0]) > 5 * scale  # undistortion did move it
+    back = np.array(undistorter.distort_boxes([(x, y, w, h)], size)[0])
+    centers = back[:2] + back[2:] / 2, raw_box[:2] + raw_box[2:] / 2
+    assert np.abs(centers[0] - centers[1]).max() <= 1.5 * scale
+
+
+def test_distorted_box_covers_the_raw_face():
+    undistorter = _undistorter()
+    raw_box = np.array([230, 30, 50, 40])
+    found = _bright_box(undistorter(_raw_frame((320, 240), raw_box)))
+    x, y, w, h = undistorter.distort_boxes([found], (320, 240))[0]
+    # The bounding box of the bent outline: it covers the face and only a margin more
+    assert x <= raw_box[0] + 1 and y <= raw_box[1] + 1
+    assert x + w >= raw_box[0] + raw_box[2] - 1 and y + h >= raw_box[1] + raw_box[3] - 1
+    assert w * h < 1.5 * raw_box[2] * raw_box[3]
+
+
+def test_no_distortion_is_the_identity():
+    undistorter = _undistorter(k1=0.0)
+    boxes = [(10, 20, 30, 40), (200, 100, 50, 60)]
+    assert undistorter.distort_boxes(boxes, (320, 240)) == boxes
+    img = np.random.default_rng(0).integers(0, 255, (240, 320), dtype=np.uint8)
+    assert np.abs(undistorter(img).astype(int) - img)[1:-1, 1:-1].max() <= 1
+
+
+def test_maps_are_built_once_per_frame_size():
+    undistorter = _undistorter()
+    assert undistorter.maps((320, 240))[0] is undistorter.maps((320, 240))[0]
+    assert undistorter.maps((160, 120))[0].shape[:2] == (120, 160)
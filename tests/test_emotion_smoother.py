@@ -0,0 +1,71 @@
+import numpy as np
+from modules.emotion_detection import MODEL_LABELS, EmotionSmoother
+
+
+def _onehot(label):
+    probs = np.zeros(len(MODEL_LABELS), dtype=np.float32)
+    probs[MODEL_LABELS.index(label)] = 1.0
+    return probs
+
+
+def test_first_update_is_taken_as_is_then_averaged():
+    smoother = EmotionSmoother(stability_window=3)  # alpha 0.5
+    happy, sad = _onehot('happy'), _onehot('sad')
+    assert np.allclose(smoother.update([happy], ['a'])[0], happy)
+    row = smoother.update([sad], ['a'])[0]
+    assert np.allclose(row, 0.5 * happy + 0.5 * sad)
+
+
+def test_keys_have_separate_rows():
+    smoother = EmotionSmoother(stability_window=3)
+    smoother([_onehot('happy'), _onehot('angry')], ['a', 'b'])
+    assert smoother([_onehot('happy')], ['a']) == ['happy']
+    assert smoother([_onehot('angry')], ['b']) == ['angry']
+    a, b = smoother.current(['a', 'b'])
+    assert a[MODEL_LABELS.index('angry')] == 0 and b[MODEL_LABELS.index('happy')] == 0
+
+
+def test_without_keys_only_the_first_face_is_smoothed():
+    smoother = EmotionSmoother(stability_window=5)  # alpha 1/3
+    smoother([_onehot('happy')])
+    # The first face keeps two thirds of its history, the second is labelled raw
+    assert smoother([_onehot('sad'), _onehot('fear')]) == ['happy', 'fear']
+    assert np.isclose(smoother.current([None])[0][MODEL_LABELS.index('sad')], 1 / 3)
+
+
+def test_confused_when_fear_and_surprise_are_both_high():
+    smoother = EmotionSmoother(threshold=0.4)
+    probs = 0.45 * _onehot('fear') + 0.45 * _onehot('surprise') + 0.1 * _onehot('neutral')
+    assert smoother.labels(probs[None]) == ['confused']
+
+
+def test_least_recently_used_row_is_recycled():
+    smoother = EmotionSmoother(capacity=2)
+    smoother.update([_onehot('happy')], ['a'])
+    smoother.update([_onehot('sad')], ['b'])
+    smoother.update([_onehot('happy')], ['a'])
+    smoother.update([_onehot('angry')], ['c'])  # takes b's row
+    a, b, c = smoother.current(['a', 'b', 'c'])
+    assert b is None and a is not None and np.allclose(c, _onehot('angry'))
+
+
+def test_batch_larger_than_capacity_grows():
+    smoother = EmotionSmoother(capacity=2)
+    rows = smoother.update(np.eye(len(MODEL_LABELS))[:5], list('abcde'))
+    assert rows.shape == (5, len(MODEL_LABELS))
+    assert all(s is not None for s in smoother.current(list('abcde')))
+
+
+def test_forget_frees_the_row():
+    smoother = EmotionSmoother(stability_window=3)
+    smoother.update([_onehot('happy')], ['a'])
+    smoother.forget(['a', 'unknown'])
+    assert smoother.current(['a']) == [None]
+    # A returning key starts from scratch
+    assert np.allclose(smoother.update([_onehot('sad')], ['a'])[0], _onehot('sad'))
+
+
+def test_fallback_keeps_last_label_per_key():
+    smoother = EmotionSmoother()
+    smoother([_onehot('happy')], ['a'])
+    assert smoother.fallback(2, ['a', 'b']) == ['happy', 'neutral']
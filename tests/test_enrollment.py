@@ -0,0 +1,90 @@
+import os
+import numpy as np
+from modules import face_index
+from modules.face_gallery import FaceGallery, gallery_file, journal_file
+from modules.face_index import IVFIndex
+from modules.face_recognition import FaceRecognizer
+
+
+def _clusters(people=40, per_person=5, dim=32, seed=0):
+    """Embeddings scattered tightly around one random direction per person"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people, dim)).astype(np.float32)
+    rows = np.repeat(centers, per_person, axis=0) + 0.05 * rng.normal(size=(people * per_person, dim))
+    labels = [f"p{i}" for i in range(people) for _ in range(per_person)]
+    return rows.astype(np.float32), labels, centers
+
+
+def test_extend_appends_without_changing_the_original():
+    rows, labels, centers = _clusters()
+    gallery = FaceGallery(rows[:100], labels[:100], index="brute")
+    first = gallery.extend(rows[100:150], labels[100:150], [""] * 50)
+    second = first.extend(rows[150:], labels[150:], [""] * 50)
+    assert (len(gallery), len(first), len(second)) == (100, 150, 200)
+    assert gallery.match(centers[35])[0][0] != "p35"
+    assert second.match(centers[35])[0][0] == "p35"
+    # Extending an older snapshot copies instead of overwriting rows a newer one owns
+    branch = gallery.extend(rows[:1], ["other"], [""])
+    assert branch.labels[100] == "other" and first.labels[100] == labels[100]
+
+
+def test_extend_empty_gallery():
+    gallery = FaceGallery(np.empty((0,)), [])
+    gallery = gallery.extend(np.eye(3, 4), ["a", "b", "c"], ["x", "y", "z"])
+    assert len(gallery) == 3 and gallery.dim == 4
+    assert gallery.match(np.array([0, 1, 0, 0]))[0][0] == "b"
+    assert list(gallery.identities) == ["x", "y", "z"]
+
+
+def test_ivf_extended_rows_are_searchable(monkeypatch):
+    monkeypatch.setattr(face_index, "IVF_TAIL_MIN_ROWS", 16)
+    rows, _, _ = _clusters(people=60, per_person=10)
+    rows = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    index = IVFIndex(rows[:300], nlist=10, nprobe=10)
+    # Appended one at a time: into the tail, which is folded into the lists once it is too long
+    for end in range(301, 601):
+        index = index.extended(rows[:end])
+    assert len(index) == 600
+    assert 300 < len(index.assignments) < 600
+    scores, found = index.search(rows[[50, 350, 599]], 1)
+    assert list(found[:, 0]) == [50, 350, 599]
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-5)
+
+
+def _recognizer(db_path, monkeypatch):
+    """FaceRecognizer whose quality check passes every image and whose embedding is the image's first row"""
+    recognizer = FaceRecognizer(db_path=db_path, auth_file=os.path.join(db_path, "none.json"), index="brute")
+    area = dict(x=0, y=0, w=8, h=8)
+    monkeypatch.setattr(recognizer, "_check_quality", lambda img, *args: ('', img, area))
+    monkeypatch.setattr(recognizer, "embed_batch",
+                        lambda crops: np.array([crop[0, :, 0] for crop in crops], dtype=np.float32))
+    return recognizer
+
+
+def _image(direction):
+    """8x8 BGR image whose fake embedding points along axis direction"""
+    img = np.zeros((8, 8, 3), dtype=np.uint8)
+    img[0, direction] = 200
+    img[4:, :, 1] = direction  # distinct pixels, so distinct stored files
+    return img
+
+
+def test_enroll_batch_rejects_duplicates_and_journals_the_rest(tmp_path, monkeypatch):
+    db_path = str(tmp_path)
+    recognizer = _recognizer(db_path, monkeypatch)
+    results = recognizer.enroll_batch([("ann", _image(0)), ("bob", _image(1)), ("bob", _image(1))])
+    assert [r.accepted for r in results] == [True, True, False]
+    assert results[2].reason == "duplicate within the batch"
+    assert all(os.path.isfile(r.path) for r in results[:2])
+    assert recognizer.gallery.match_batch(np.eye(8)[:2]) == [("ann", 1.0), ("bob", 1.0)]
+
+    results = recognizer.enroll_batch([("ann", _image(0)), ("cid", _image(2))])
+    assert [r.reason for r in results] == ["duplicate of an enrolled image", ""]
+    assert len(recognizer.gallery) == 3
+
+    # The journal carries the embeddings, so a reload folds them in without re-embedding
+    header_path = gallery_file(db_path, recognizer.model_name, recognizer.detector_backend)
+    assert os.path.isfile(journal_file(header_path))
+    reloaded = FaceGallery.load(db_path, index="brute")
+    assert sorted(reloaded.labels) == ["ann", "bob", "cid"]
+    assert not os.path.isfile(journal_file(header_path))
@@ -0,0 +1,55 @@
+import numpy as np
+from modules.face_gallery import FaceGallery
+
+
+def _clusters(people=40, per_person=5, dim=32, seed=0):
+    """Embeddings scattered tightly around one random direction per person"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people, dim)).astype(np.float32)
+    rows = np.repeat(centers, per_person, axis=0) + 0.05 * rng.normal(size=(people * per_person, dim))
+    labels = [f"p{i}" for i in range(people) for _ in range(per_person)]
+    return rows.astype(np.float32), labels, centers
+
+
+def test_match_returns_closest_label_and_cosine_similarity():
+    rows, labels, centers = _clusters()
+    gallery = FaceGallery(rows, labels, index="brute")
+    name, similarity = gallery.match(centers[7])[0]
+    assert name == "p7"
+    assert 0.9 < similarity <= 1.0 + 1e-6
+    # Scale does not matter: rows and queries are L2-normalized
+    assert gallery.match(10 * centers[7])[0][0] == "p7"
+
+
+def test_match_top_k_is_sorted():
+    rows, labels, centers = _clusters()
+    gallery = FaceGallery(rows, labels, index="brute")
+    scores = [s for _, s in gallery.match(centers[3], top_k=5)]
+    assert scores == sorted(scores, reverse=True)
+    assert len(scores) == 5
+
+
+def test_match_batch_agrees_with_match():
+    rows, labels, centers = _clusters()
+    gallery = FaceGallery(rows, labels, index="brute")
+    batch = gallery.match_batch(centers[:10])
+    assert [name for name, _ in batch] == [gallery.match(c)[0][0] for c in centers[:10]]
+
+
+
+def test_match_batch_on_empty_gallery_keeps_one_row_per_query():
+    empty = FaceGallery(np.empty((0, 32), dtype=np.float32), [], index="brute")
+    queries = np.ones((3, 32), dtype=np.float32)
+    assert empty.match(queries[0]) == []
+    for aggregate in (None, "mean"):
+        assert empty.match_batch(queries, aggregate=aggregate) == [(None, 0.0)] * 3
+
+def test_aggregate_scores_each_identity_once():
+    rows = np.array([[1, 0], [0, 1], [0.6, 0.8]], dtype=np.float32)
+    gallery = FaceGallery(rows, ["a", "b", "b"], index="brute")
+    query = np.array([0.8, 0.6], dtype=np.float32)
+    # Single best image: a (0.8) vs b's second image (0.96)
+    assert gallery.match(query)[0][0] == "b"
+    mean = dict(gallery.match(query, top_k=2, aggregate="mean"))
+    assert np.isclose(mean["a"], 0.8) and np.isclose(mean["b"], (0.6 + 0.96) / 2)
+    assert np.isclose(dict(gallery.match(query, top_k=2, aggregate="max"))["b"], 0.96)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from modules.face_gallery import FaceGallery
+from modules.face_index import BruteForceIndex, IVFIndex, build_index
+
+
+def _normalized_clusters(people=100, per_person=10, dim=32, seed=0):
+    """Unit rows scattered tightly around one random direction per person, and those directions"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people, dim)).astype(np.float32)
+    rows = np.repeat(centers, per_person, axis=0) + 0.05 * rng.normal(size=(people * per_person, dim))
+    rows = (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+    return rows, centers / np.linalg.norm(centers, axis=1, keepdims=True)
+
+
+def test_ivf_finds_the_same_rows_as_exact_search():
+    rows, queries = _normalized_clusters()
+    exact = BruteForceIndex(rows).search(queries, 5)
+    approx = IVFIndex(rows, nlist=20, nprobe=4).search(queries, 5)
+    assert np.mean(exact[1][:, 0] == approx[1][:, 0]) >= 0.95
+    assert np.allclose(np.sort(approx[0], axis=1)[:, ::-1], approx[0])
+
+
+def test_ivf_probing_every_list_is_exact():
+    rows, queries = _normalized_clusters(people=30)
+    exact = BruteForceIndex(rows).search(queries, 3)
+    approx = IVFIndex(rows, nlist=8, nprobe=8).search(queries, 3)
+    assert np.array_equal(exact[1], approx[1])
+    assert np.allclose(exact[0], approx[0], atol=1e-5)
+
+
+def test_search_pads_past_gallery_size():
+    rows = np.eye(3, dtype=np.float32)
+    for index in (BruteForceIndex(rows), IVFIndex(rows, nlist=2, nprobe=2)):
+        scores, found = index.search(rows[:1], 5)
+        assert found[0, 0] == 0
+        assert list(found[0, 3:]) == [-1, -1] and np.all(np.isneginf(scores[0, 3:]))
+
+
+def test_build_index_picks_by_kind():
+    rows = np.eye(4, dtype=np.float32)
+    assert isinstance(build_index(rows, "auto"), BruteForceIndex)
+    assert isinstance(build_index(rows, "ivf"), IVFIndex)
+    with pytest.raises(ValueError):
+        build_index(rows, "hnsw")
+
+
+def test_gallery_matches_through_the_ivf_index():
+    rows, queries = _normalized_clusters(people=50, per_person=4)
+    labels = [f"p{i}" for i in range(50) for _ in range(4)]
+    gallery = FaceGallery(rows, labels, index="ivf")
+    assert isinstance(gallery.index, IVFIndex)
+    assert [name for name, _ in gallery.match_batch(queries[:10])] == [f"p{i}" for i in range(10)]
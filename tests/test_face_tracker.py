@@ -0,0 +1,113 @@
+import numpy as np
+from modules.face_pipeline import DetectedFace
+from modules.face_tracker import FaceTracker, iou
+
+FRAME = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+def _face(x, y, w=40, h=40):
+    return DetectedFace(np.zeros((w, h, 3), dtype=np.uint8), (x, y, w, h), {}, 0.99)
+
+
+def _tracker(**kwargs):
+    return FaceTracker(use_cv_tracker=False, **kwargs)
+
+
+def test_iou():
+    assert iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+    assert np.isclose(iou((0, 0, 10, 10), (5, 0, 10, 10)), 50 / 150)
+    assert iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def test_new_faces_start_tracks_that_need_identification():
+    tracker = _tracker()
+    pending = tracker.associate([_face(10, 10), _face(200, 100)], FRAME)
+    assert [track_id for track_id, _ in pending] == [0, 1]
+    assert [r.box for r in tracker.update(FRAME)] == [(10, 10, 40, 40), (200, 100, 40, 40)]
+
+
+def test_overlapping_detection_keeps_its_track():
+    tracker = _tracker()
+    (track_id, _), = tracker.associate([_face(10, 10)], FRAME)
+    tracker.assign(track_id, "alice", 0.9, "happy")
+    # Moved a little: same track, already identified, so nothing to embed
+    assert tracker.associate([_face(14, 12)], FRAME) == []
+    result, = tracker.update(FRAME)
+    assert result.box == (14, 12, 40, 40) and result.name == "alice" and result.emotion == "happy"
+
+
+def test_greedy_association_prefers_the_best_overlap():
+    tracker = _tracker()
+    tracker.associate([_face(0, 0), _face(30, 0)], FRAME)
+    tracker.assign(0, "a", 0.9, "neutral")
+    tracker.assign(1, "b", 0.9, "neutral")
+    tracker.associate([_face(28, 0), _face(2, 0)], FRAME)
+    boxes = {r.name: r.box for r in tracker.update(FRAME)}
+    assert boxes == {"a": (2, 0, 40, 40), "b": (28, 0, 40, 40)}
+
+
+def test_unmatched_tracks_are_dropped_after_max_misses():
+    dropped = []
+    tracker = _tracker(max_misses=1, on_drop=dropped.extend)
+    tracker.associate([_face(10, 10)], FRAME)
+    tracker.associate([], FRAME)
+    assert len(tracker.tracks) == 1 and dropped == []
+    tracker.associate([], FRAME)
+    assert tracker.tracks == [] and dropped == [0]
+
+
+def test_decayed_confidence_triggers_reidentification():
+    tracker = _tracker(confidence_decay=0.6, min_confidence=0.5)
+    (track_id, _), = tracker.associate([_face(10, 10)], FRAME)
+    tracker.assign(track_id, "alice", 0.9, "neutral")
+    tracker.update(FRAME)
+    assert tracker.associate([_face(10, 10)], FRAME) == []
+    tracker.update(FRAME)
+    assert [t for t, _ in tracker.associate([_face(10, 10)], FRAME)] == [track_id]
+
+
+def test_boxes_extrapolate_at_the_detected_velocity():
+    tracker = _tracker()
+    tracker.associate([_face(10, 10)], FRAME)
+    tracker.update(FRAME)
+    tracker.update(FRAME)
+    tracker.associate([_face(14, 10)], FRAME)  # 4px over 2 frames, averaged with 0: 1px/frame
+    result, = tracker.update(FRAME)
+    assert result.box == (15, 10, 40, 40)
+
+
+class _FakeCvTracker:
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.box = None
+        self.inits = 0
+
+    def init(self, frame, box):
+        self.inits += 1
+        self.box = box
+
+    def update(self, frame):
+        # The OpenCV update must not block associate()/assign()
+        assert not self.tracker._lock.locked()
+        return True, self.box
+
+
+def test_cv_tracker_restarts_only_after_drift(monkeypatch):
+    tracker = FaceTracker(reinit_iou=0.5)
+    created = []
+
+    def make():
+        created.append(_FakeCvTracker(tracker))
+        return created[-1]
+
+    monkeypatch.setattr("modules.face_tracker._make_cv_tracker", make)
+    tracker.associate([_face(10, 10)], FRAME)
+    tracker.update(FRAME)
+    tracker.associate([_face(12, 10)], FRAME)
+    assert len(created) == 1
+    tracker.update(FRAME)
+    # Same track (IoU 0.38 > 0.3) but the tracker box no longer covers the face
+    tracker.associate([_face(28, 10)], FRAME)
+    assert len(created) == 2 and created[1].box == (28, 10, 40, 40)
+    assert tracker.update(FRAME)[0].box == (28, 10, 40, 40)
@@ -0,0 +1,61 @@
+import time
+import cv2
+import numpy as np
+import pytest
+from modules.frame_source import CaptureThread
+
+FRAMES = 20
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Short MJPG clip whose frame i is uniformly gray level 10 * i"""
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("no MJPG writer in this OpenCV build")
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def _wait_for_end(capture, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not capture.ended and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert capture.ended
+
+
+def test_unread_frames_are_dropped_for_the_newest(video):
+    capture = CaptureThread(video).start()
+    try:
+        _wait_for_end(capture)
+        ok, frame = capture.read()
+        assert ok and abs(float(frame.mean()) - 10 * (FRAMES - 1)) < 3
+        stats = capture.stats()
+        assert stats['captured'] == FRAMES
+        assert stats['dropped'] == FRAMES - 1 and stats['read'] == 1
+        # Nothing newer than what was returned: the source has ended
+        assert capture.read(timeout=0.1) == (False, None)
+    finally:
+        capture.stop()
+
+
+def test_every_frame_is_read_when_the_consumer_keeps_up(video):
+    capture = CaptureThread(video, realtime=True).start()
+    levels, previous = [], None
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            # One buffer, reused by every read
+            assert previous is None or frame is previous
+            previous = frame
+            levels.append(round(float(frame.mean()) / 10))
+    finally:
+        capture.stop()
+    assert levels == sorted(levels) and levels[-1] == FRAMES - 1
+    stats = capture.stats()
+    assert stats['read'] + stats['dropped'] == stats['captured'] == FRAMES
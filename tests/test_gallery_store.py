@@ -0,0 +1,90 @@
+import os
+import glob
+import json
+import numpy as np
+from modules.face_gallery import FaceGallery, gallery_file, make_representation
+
+
+def _fake_db(tmp_path, monkeypatch, people=4, per_person=2, dim=16):
+    """
+    Gallery folder of empty image files whose "embedding" is looked up in a
+    table, so FaceGallery.load runs without DeepFace. Returns (db path,
+    embedding table by relative path, list the embedded paths are recorded in)
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(people, dim)).astype(np.float32)
+    table = {}
+    for p in range(people):
+        os.makedirs(tmp_path / f"p{p}")
+        for i in range(per_person):
+            rel = os.path.join(f"p{p}", f"{i}.jpg")
+            (tmp_path / rel).write_bytes(b"")
+            table[rel] = centers[p] + 0.05 * rng.normal(size=dim).astype(np.float32)
+    embedded = []
+
+    def build(db_path, model_name, detector_backend, new):
+        embedded.extend(new)
+        return [make_representation(os.path.join(db_path, rel), table[rel], dict(x=0, y=0, w=1, h=1))
+                for rel in new]
+    monkeypatch.setattr(FaceGallery, "_build_representations", staticmethod(build))
+    return str(tmp_path), table, embedded
+
+
+def test_saved_gallery_is_mapped_back_without_embedding(tmp_path, monkeypatch):
+    db_path, table, embedded = _fake_db(tmp_path, monkeypatch)
+    first = FaceGallery.load(db_path, index="brute")
+    assert len(embedded) == len(table)
+
+    gallery = FaceGallery.load(db_path, index="brute")
+    assert len(embedded) == len(table)  # nothing embedded again
+    assert isinstance(gallery.embeddings, np.memmap)
+    assert np.array_equal(np.asarray(gallery.embeddings), first.embeddings)
+    assert list(gallery.labels) == list(first.labels)
+    assert list(gallery.identities) == list(first.identities)
+
+
+def test_float16_gallery_stays_memory_mapped(tmp_path, monkeypatch):
+    db_path, table, _ = _fake_db(tmp_path, monkeypatch)
+    FaceGallery.load(db_path, index="brute", dtype="float16")
+
+    gallery = FaceGallery.load(db_path, index="brute", dtype="float16")
+    assert isinstance(gallery.embeddings, np.memmap) and gallery.embeddings.dtype == np.float16
+    query = table[os.path.join("p2", "0.jpg")]
+    assert gallery.similarities(query).dtype == np.float32
+    assert gallery.match(query)[0][0] == "p2"
+    queries = np.array([table[os.path.join(f"p{p}", "1.jpg")] for p in range(4)])
+    assert [name for name, _ in gallery.match_batch(queries, aggregate="mean")] == ["p0", "p1", "p2", "p3"]
+
+
+def test_other_format_version_is_rebuilt(tmp_path, monkeypatch):
+    db_path, table, embedded = _fake_db(tmp_path, monkeypatch)
+    FaceGallery.load(db_path, index="brute")
+    header_path = gallery_file(db_path, "Facenet", "retinaface")
+    with open(header_path) as f:
+        header = json.load(f)
+    header['version'] = 0
+    with open(header_path, 'w') as f:
+        json.dump(header, f)
+
+    gallery = FaceGallery.load(db_path, index="brute")
+    assert len(embedded) == 2 * len(table)
+    assert len(gallery) == len(table)
+    with open(header_path) as f:
+        assert json.load(f)['version'] != 0
+
+
+def test_reload_drops_deleted_and_embeds_only_new_images(tmp_path, monkeypatch):
+    db_path, table, embedded = _fake_db(tmp_path, monkeypatch)
+    FaceGallery.load(db_path, index="brute")
+    os.remove(os.path.join(db_path, "p0", "0.jpg"))
+    rel = os.path.join("p1", "new.jpg")
+    (tmp_path / rel).write_bytes(b"")
+    table[rel] = table[os.path.join("p1", "0.jpg")]
+    del embedded[:]
+
+    gallery = FaceGallery.load(db_path, index="brute")
+    assert embedded == [rel]
+    identities = {os.path.relpath(i, db_path) for i in gallery.identities}
+    assert os.path.join("p0", "0.jpg") not in identities and rel in identities
+    # The rewrite replaced the matrix file instead of keeping old generations around
+    assert len(glob.glob(os.path.join(db_path, "*.npy"))) == 1
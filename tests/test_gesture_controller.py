@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+import numpy as np
+from modules.gesture_controller import INDEX_TIP, THUMB_TIP, GestureController
+
+
+class FakeHands:
+    """Stands in for mediapipe Hands: reports a fixed hand (normalized to its input) or none"""
+
+    def __init__(self, landmarks):
+        self.landmarks = landmarks
+        self.inputs = []
+
+    def process(self, image):
+        self.inputs.append(image.shape)
+        if self.landmarks is None:
+            return SimpleNamespace(multi_hand_landmarks=None)
+        points = [SimpleNamespace(x=x, y=y) for x, y in self.landmarks]
+        return SimpleNamespace(multi_hand_landmarks=[SimpleNamespace(landmark=points)])
+
+
+def _hand(thumb, index, center=(0.5, 0.5), size=0.1):
+    """21 normalized landmarks clustered around center, with the given thumb and index tips"""
+    points = [(center[0] + size * np.cos(a), center[1] + size * np.sin(a))
+              for a in np.linspace(0, 2 * np.pi, 21, endpoint=False)]
+    points[THUMB_TIP], points[INDEX_TIP] = thumb, index
+    return points
+
+
+def _controller(landmarks, **kwargs):
+    """GestureController without MediaPipe or system volume (see __init__ for the defaults)"""
+    controller = GestureController.__new__(GestureController)
+    settings = dict(process_width=320, roi_margin=0.5, process_every=1, hysteresis=2.0, min_interval=0.0)
+    settings.update(kwargs)
+    for name, value in settings.items():
+        setattr(controller, name, value)
+    controller.hands = FakeHands(landmarks)
+    controller.connections = np.array([[0, 1], [1, 2]], dtype=np.intp)
+    controller.roi = controller.hand = None
+    controller.frame_index = 0
+    controller.volume_control = {'available': False}
+    controller.applied_vol, controller.applied_at = None, 0.0
+    controller.vol_bar, controller.vol_per = 400, 0
+    controller.bar_x, controller.bar_y_top, controller.bar_y_bottom = 50, 150, 400
+    return controller
+
+
+def test_search_narrows_to_the_hand_and_is_downscaled():
+    controller = _controller(_hand((0.45, 0.5), (0.55, 0.5)))
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    controller.process_frame(frame, mirror=False)
+    # First search: the whole frame, downscaled to process_width
+    assert controller.hands.inputs[0][:2] == (240, 320)
+    x0, y0, x1, y1 = controller.roi
+    assert 0 < x0 < 320 - 64 and 320 + 64 < x1 < 640
+    assert 0 < y0 < 240 - 48 and 240 + 48 < y1 < 480
+    controller.process_frame(frame, mirror=False)
+    assert max(controller.hands.inputs[1][:2]) <= 320
+
+
+def test_lost_hand_falls_back_to_a_full_frame_search():
+    controller = _controller(_hand((0.45, 0.5), (0.55, 0.5)))
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    controller.process_frame(frame, mirror=False)
+    controller.hands.landmarks = None
+    controller.process_frame(frame, mirror=False)
+    assert controller.roi is None and controller.hand is None
+    controller.process_frame(frame, mirror=False)
+    assert controller.hands.inputs[-1][:2] == (240, 320)
+
+
+def test_pinch_sets_the_volume_with_hysteresis():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    # Tips 0.2 * 640 = 128 px apart: (128 - 50) / 170 of the range
+    controller = _controller(_hand((0.4, 0.5), (0.6, 0.5)))
+    controller.process_frame(frame, mirror=False)
+    assert np.isclose(controller.vol_per, 100 * 78 / 170, atol=1.0)
+    # A pinch that moved less than the hysteresis band leaves the level alone
+    level = controller.vol_per
+    controller.hands.landmarks = _hand((0.4, 0.5), (0.601, 0.5))
+    controller.roi = None  # the fake's landmarks are relative to whatever region it is given
+    controller.process_frame(frame, mirror=False)
+    assert controller.vol_per == level
+
+
+def test_landmarks_are_reused_between_processed_frames():
+    controller = _controller(_hand((0.45, 0.5), (0.55, 0.5)), process_every=3)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    for _ in range(9):
+        controller.process_frame(frame, mirror=False)
+    # The first frame (no hand yet), then every third
+    assert len(controller.hands.inputs) == 4
+
+
+def test_skeleton_is_optional():
+    landmarks = _hand((0.45, 0.5), (0.55, 0.5))
+    wrist = tuple(int(v) for v in np.array(landmarks[0]) * (640, 480))
+    for draw_hand in (True, False):
+        controller = _controller(landmarks)
+        frame = controller.process_frame(np.zeros((480, 640, 3), dtype=np.uint8), mirror=False,
+                                         draw_hand=draw_hand)
+        assert frame[wrist[1], wrist[0]].any() == draw_hand
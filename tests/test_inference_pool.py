@@ -0,0 +1,50 @@
+import time
+import numpy as np
+import pytest
+from modules.face_pipeline import DetectedFace
+from modules.inference_pool import InferencePool
+
+SHAPE = (48, 64, 3)
+
+
+def _failing_pool(**kwargs):
+    """Pool whose workers die at startup: FaceRecognizer rejects the argument, with or without DeepFace"""
+    return InferencePool(1, SHAPE, recognizer_kwargs={'no_such_option': 1}, health_interval=0.05,
+                         task_timeout=5.0, **kwargs)
+
+
+def test_startup_failures_are_capped_and_raised_from_warm_up():
+    pool = _failing_pool(max_startup_failures=2, restart_backoff=0.05)
+    try:
+        start = time.monotonic()
+        with pytest.raises(RuntimeError, match="failed to start 2 times in a row.*TypeError"):
+            pool.warm_up(timeout=60)
+        assert time.monotonic() - start < 60
+        assert pool.restarts == 1 and pool.error is not None
+
+        # A failed pool answers at once: no faces, unknown identities
+        assert pool.detect(np.zeros(SHAPE, dtype=np.uint8)) == []
+        face = DetectedFace(np.zeros((8, 8, 3), dtype=np.uint8), (1, 2, 3, 4), {}, 0.9)
+        result = pool.identify([face], keys=[7])[0]
+        assert (result.box, result.name, result.confidence) == ((1, 2, 3, 4), None, 0.0)
+        assert pool.pending == 0
+    finally:
+        pool.close()
+
+
+def test_warm_up_times_out_while_a_worker_backs_off():
+    pool = _failing_pool(max_startup_failures=100, restart_backoff=30.0)
+    try:
+        with pytest.raises(TimeoutError, match="1 of 1 inference workers not ready"):
+            pool.warm_up(timeout=0.5)
+    finally:
+        pool.close()
+
+
+def test_detect_rejects_other_frame_shapes():
+    pool = _failing_pool(max_startup_failures=100, restart_backoff=30.0)
+    try:
+        with pytest.raises(ValueError):
+            pool.detect(np.zeros((10, 10, 3), dtype=np.uint8))
+    finally:
+        pool.close()
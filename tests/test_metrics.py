@@ -0,0 +1,52 @@
+import math
+from modules.metrics import LATENCY_BUCKETS, StageTimer, prometheus_text
+
+
+def test_durations_land_in_their_bucket():
+    timer = StageTimer()
+    timer.record('detect', 0.003)   # (0.0025, 0.005]
+    timer.record('detect', 0.005)   # upper bounds are inclusive
+    timer.record('detect', 30.0)    # past the last bound: +Inf bucket
+    histogram = timer.histograms['detect']
+    assert len(histogram) == len(LATENCY_BUCKETS) + 1
+    assert histogram[LATENCY_BUCKETS.index(0.005)] == 2
+    assert histogram[-1] == 1
+    assert sum(histogram) == timer.calls['detect'] == 3
+
+
+def test_quantile_is_the_bucket_upper_bound():
+    timer = StageTimer()
+    for _ in range(9):
+        timer.record('embed', 0.02)
+    timer.record('embed', 0.4)
+    assert timer.quantile('embed', 0.5) == 0.025
+    assert timer.quantile('embed', 0.9) == 0.025
+    assert timer.quantile('embed', 0.95) == 0.5
+    assert timer.quantile('missing', 0.5) == 0.0
+    timer.record('slow', 60.0)
+    assert math.isinf(timer.quantile('slow', 0.5))
+
+
+def test_summary_reports_means_and_percentiles():
+    timer = StageTimer()
+    timer.record('match', 0.001)
+    timer.record('match', 0.003)
+    summary = timer.summary()['match']
+    assert summary['calls'] == 2
+    assert math.isclose(summary['mean_ms'], 2.0)
+    assert summary['p50_ms'] == 1.0 and summary['p95_ms'] == 5.0
+
+
+def test_prometheus_buckets_are_cumulative():
+    timer = StageTimer()
+    timer.record('log', 0.0001)
+    timer.record('log', 0.2)
+    timer.add('faces', 3)
+    timer.set('queue depth', 2)
+    text = prometheus_text(timer, prefix="t")
+    assert 't_stage_seconds_bucket{stage="log",le="0.0005"} 1' in text
+    assert 't_stage_seconds_bucket{stage="log",le="0.25"} 2' in text
+    assert 't_stage_seconds_bucket{stage="log",le="+Inf"} 2' in text
+    assert 't_stage_seconds_count{stage="log"} 2' in text
+    assert 't_faces_total 3' in text
+    assert 't_queue_depth 2' in text
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from modules.scheduler import InferenceScheduler
+
+STILL = np.full((120, 160, 3), 100, dtype=np.uint8)
+MOVED = np.full((120, 160, 3), 140, dtype=np.uint8)
+
+
+def test_first_frame_is_submitted():
+    scheduler = InferenceScheduler()
+    assert scheduler.should_submit(STILL, now=0.0)
+    assert scheduler.submitted == 1
+
+
+def test_static_scene_waits_for_backoff_refresh():
+    scheduler = InferenceScheduler(idle_interval=1.0, max_idle_interval=4.0)
+    assert scheduler.should_submit(STILL, now=0.0)
+    assert not scheduler.should_submit(STILL, now=0.5)
+    assert scheduler.skipped_static == 1
+    # Refreshes at 1s, then 2s and 4s apart (capped)
+    assert scheduler.should_submit(STILL, now=1.0)
+    assert not scheduler.should_submit(STILL, now=2.5)
+    assert scheduler.should_submit(STILL, now=3.0)
+    assert not scheduler.should_submit(STILL, now=6.5)
+    assert scheduler.should_submit(STILL, now=7.0)
+    assert scheduler.should_submit(STILL, now=11.0)
+
+
+def test_motion_submits_and_resets_backoff():
+    scheduler = InferenceScheduler(idle_interval=1.0)
+    scheduler.should_submit(STILL, now=0.0)
+    scheduler.should_submit(STILL, now=1.0)
+    assert scheduler.should_submit(MOVED, now=1.1)
+    assert scheduler.last_motion == pytest.approx(40.0)
+    assert scheduler.stats()['backoff_s'] == 1.0
+
+
+def test_cpu_budget_spaces_submissions():
+    scheduler = InferenceScheduler(cpu_budget=0.5)
+    assert scheduler.should_submit(STILL, now=0.0)
+    scheduler.completed(0.2)
+    # A 0.2s job at a 50% budget may start every 0.4s, motion or not
+    assert not scheduler.should_submit(MOVED, now=0.3)
+    assert scheduler.skipped_budget == 1
+    assert scheduler.should_submit(MOVED, now=0.4)
+
+
+def test_budget_is_shared_by_workers():
+    scheduler = InferenceScheduler(cpu_budget=0.5, workers=2)
+    scheduler.should_submit(STILL, now=0.0)
+    scheduler.completed(0.2)
+    assert scheduler.should_submit(MOVED, now=0.2)
+
+
+@pytest.mark.parametrize("kwargs", [{"cpu_budget": 0}, {"cpu_budget": 1.5}, {"workers": 0}])
+def test_invalid_budget_or_workers(kwargs):
+    with pytest.raises(ValueError):
+        InferenceScheduler(**kwargs)